@@ -1,10 +1,30 @@
-from flask import Flask, request, jsonify, render_template, session
+from flask import Flask, Response, request, jsonify, render_template, session, stream_with_context
+import atexit
+import base64
+import bisect
+import http.client
+import logging
+import logging.handlers
+import queue
 import random
-from datetime import datetime
+import urllib.parse
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import hmac
 import json
 import os
+import re
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from xml.sax.saxutils import escape as xml_escape
 from dotenv import load_dotenv
-import openai
+# openai is imported where it is used: it is most of the module's import
+# time, and local answers never need it (see warm_up below)
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
@@ -12,6 +32,142 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'canyon-dev-secret')  # For session support
 
+# --- Logging & Metrics ---
+# Log records go onto a queue and are formatted, redacted and written by a
+# background listener, so request threads never block on stderr.
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.1'))
+LOG_SLOW_SECONDS = float(os.getenv('LOG_SLOW_SECONDS', '2'))
+LOG_QUEUE_SIZE = 10000
+PHONE_NUMBER = re.compile(r"\+\d{8,15}|\(?\b\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}\b")
+REDACTED_HEADERS = {'authorization', 'cookie', 'set-cookie', 'x-twilio-signature'}
+
+def redact(value):
+    """Mask phone numbers (keeping the last two digits) and credential headers."""
+    if isinstance(value, str):
+        return PHONE_NUMBER.sub(lambda m: '***' + m.group()[-2:], value)
+    if isinstance(value, dict):
+        return {k: '[redacted]' if str(k).lower() in REDACTED_HEADERS else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(redact(entry), ensure_ascii=False, default=str)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks: drops records when the queue is full and counts them."""
+    dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+log = logging.getLogger('canyon')
+log.setLevel(logging.INFO)
+log.propagate = False
+_log_output = logging.StreamHandler(sys.stderr)
+_log_output.setFormatter(JsonFormatter())
+_log_listener = None
+
+def start_log_listener():
+    """Route `log` through a fresh queue and start the thread that drains it."""
+    global _log_listener
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    log.handlers = [DroppingQueueHandler(log_queue)]
+    _log_listener = logging.handlers.QueueListener(log_queue, _log_output)
+    _log_listener.start()
+
+def stop_log_listener():
+    """Flush and stop the listener thread; later records are written directly."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+    log.handlers = [_log_output]
+
+start_log_listener()
+atexit.register(stop_log_listener)
+
+def log_event(event, sampled=True, **fields):
+    """Structured INFO log; routine events are kept at LOG_SAMPLE_RATE."""
+    if sampled and random.random() >= LOG_SAMPLE_RATE:
+        return
+    log.info(event, extra={"fields": fields})
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25)
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Metrics:
+    """Latency histograms keyed by metric name and labels, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self.histograms = {}  # (name, (("label", "value"), ...)) -> Histogram
+        self.lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            items = sorted(self.histograms.items())
+            for i, ((name, labels), hist) in enumerate(items):
+                if i == 0 or items[i - 1][0][0] != name:
+                    lines.append(f"# TYPE {name} histogram")
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                cumulative = 0
+                for bound, count in zip([*hist.buckets, "+Inf"], hist.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label_text + "," if label_text else ""}le="{bound}"}} {cumulative}')
+                suffix = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{name}_sum{suffix} {hist.sum}")
+                lines.append(f"{name}_count{suffix} {hist.count}")
+        return lines
+
+metrics = Metrics()
+
+def render_gauges(prefix, values):
+    return [f"{prefix}_{k} {float(v)}" for k, v in sorted(values.items()) if isinstance(v, (int, float))]
+
 # --- Dummy Data ---
 EXHIBITIONS = [
     {"title": "Reflections in Real Time", "desc": "18 minutes of gorgeous glitch.", "gallery": 3},
@@ -55,15 +211,224 @@ def suggest_event():
 def get_bathroom_info():
     return "🚻 Nearest washrooms are just past Gallery 1. Here’s a map 🗺️ 👉 https://canyon.fake/bathrooms"
 
+def get_directions_info():
+    return (
+        "🗺️ Canyon is at 456 Postmodern Ave, New York, NY 10013.\n"
+        "Here’s a map: https://goo.gl/maps/xyzCanyon\n"
+        "Subway: Canal St (A/C/E/N/Q/R/6).\n"
+        "If you get lost, just text me—I’ll send a poetic rescue squad."
+    )
+
+def get_purchase_info():
+    return f"🎟️ Tickets, passes and café orders all live here 👉 {CHECKOUT_LINK}"
+
 # --- Custom Knowledge Loader ---
-def load_custom_knowledge():
-    path = os.path.join(os.path.dirname(__file__), 'custom_knowledge.json')
+KNOWLEDGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'custom_knowledge.json')
+
+def load_custom_knowledge(path=KNOWLEDGE_PATH):
+    """Return the list of {keywords, response} entries, or None if the file is unreadable."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        log.error("knowledge_load_failed", extra={"fields": {"path": path, "error": str(e)}})
+        return None
+    if not isinstance(entries, list):
+        log.error("knowledge_load_failed", extra={"fields": {"path": path, "error": "expected a list of entries"}})
+        return None
+    valid = [e for e in entries if valid_knowledge_entry(e)]
+    if len(valid) < len(entries):
+        log.warning("knowledge_entries_skipped", extra={"fields": {"path": path, "skipped": len(entries) - len(valid)}})
+    return valid
+
+def valid_knowledge_entry(entry):
+    """True for {"keywords": [non-empty str, ...], "response": non-empty str}."""
+    if not isinstance(entry, dict):
+        return False
+    keywords, response = entry.get('keywords'), entry.get('response')
+    return (isinstance(keywords, list) and bool(keywords) and all(isinstance(k, str) and k.strip() for k in keywords)
+            and isinstance(response, str) and bool(response.strip()))
+
 CHECKOUT_LINK = "https://canyon.fake/checkout"
 PURCHASE_KEYWORDS = [
     "buy ticket", "purchase ticket", "admission", "buy admission",
     "get tickets", "purchase pass", "order food", "menu item", "buy", "purchase"
 ]
 
+# --- Intent Router ---
+GREETING_KEYWORDS = ["hello", "hi", "hey"]
+
+def build_intents(knowledge):
+    """All locally answerable intents, highest priority first.
+
+    Each intent is {"name", "keywords", "reply"} where reply is a string or a
+    zero-argument callable. Greeting comes last so "hi, when are you open?"
+    gets the hours rather than a hello. Bathroom and directions are
+    "pinned" above everything else; intents for one named event, exhibition
+    or menu item are marked "specific". Greetings don't match plurals.
+    """
+    intents = [
+        {"name": "bathroom", "keywords": ["bathroom", "restroom", "toilet", "washroom"], "reply": get_bathroom_info,
+         "pinned": True},
+        {"name": "directions", "keywords": ["how do i get", "directions", "address", "where is canyon", "get to canyon", "find canyon"], "reply": get_directions_info,
+         "pinned": True},
+        # Not pinned: "the location of the live coding demo" is about the event
+        {"name": "directions", "keywords": ["location"], "reply": get_directions_info},
+    ]
+    for i, entry in enumerate(knowledge):
+        intents.append({"name": f"knowledge:{i}", "keywords": entry['keywords'], "reply": entry['response']})
+    intents.append({"name": "purchase", "keywords": PURCHASE_KEYWORDS, "reply": get_purchase_info})
+    for event in EVENTS:
+        intents.append({
+            "name": "event",
+            # "Artist Q&A: Ada Loop" is also asked about as "the Artist Q&A" or "Ada Loop"
+            "keywords": [event['name'], *(part.strip() for part in event['name'].split(':'))],
+            "reply": f"{event['name']} is at {event['time']} in {event['location']}.",
+            "specific": True,
+        })
+    intents.append({"name": "events", "keywords": ["event", "schedule"], "reply": suggest_event})
+    for ex in EXHIBITIONS:
+        intents.append({
+            "name": "exhibition",
+            "keywords": [ex['title']],
+            "reply": f"*{ex['title']}* — {ex['desc']} (Gallery {ex['gallery']})",
+            "specific": True,
+        })
+    intents.append({"name": "exhibitions", "keywords": ["exhibition", "exhibit", "installation"], "reply": suggest_exhibition})
+    for item in MENU:
+        intents.append({"name": "menu_item", "keywords": [item['item']], "reply": f"{item['item']}: {item['desc']}",
+                        "specific": True})
+    # "hi" must not match "his"
+    intents.append({"name": "greeting", "keywords": GREETING_KEYWORDS, "reply": get_greeting, "plurals": False})
+    return intents
+
+def plural(keyword):
+    return keyword + ('es' if keyword.endswith(('s', 'x', 'z', 'ch', 'sh')) else 's')
+
+def _trie_pattern(keywords):
+    """Alternation regex with shared prefixes factored out.
+
+    `re` tries alternatives one by one, so a flat "a|b|c" costs time linear
+    in the keyword count at every position. Nesting by prefix lets the
+    engine reject most keywords after their first character. Longer
+    continuations are tried before shorter ones, so the most specific
+    keyword wins at a given position.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for ch in keyword:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def render(node):
+        branches = [re.escape(ch) + render(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        optional = '' in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')' + ('?' if optional else '')
+
+    return render(trie)
+
+class IntentRouter:
+    """One precompiled alternation regex over every intent keyword.
+
+    Keywords match on word boundaries, so "hi" no longer fires on "this";
+    plurals are indexed as keywords of their own, except for intents with
+    "plurals": False. The alternation is a prefix trie, so the most
+    specific keyword wins at any position, and a ranked index maps each
+    matched keyword back to its intent. Pinned intents (bathroom,
+    directions) win over everything; next, a multi-word name of a specific
+    intent ("live coding demo") outranks knowledge and generic keywords
+    ("location", "late"); within a tier the lowest intent rank across all
+    matches in the message wins. A keyword listed by several intents
+    belongs to the first (highest priority) one.
+    """
+
+    def __init__(self, intents):
+        self.intents = intents
+        self.index = {}
+        for rank, intent in enumerate(intents):
+            for keyword in intent['keywords']:
+                keyword = normalize_message(keyword)
+                if not keyword:
+                    continue
+                if intent.get('pinned'):
+                    tier = 0
+                elif intent.get('specific') and ' ' in keyword:
+                    tier = 1
+                else:
+                    tier = 2
+                forms = [keyword, plural(keyword)] if intent.get('plurals', True) else [keyword]
+                for form in forms:
+                    if form not in self.index:
+                        self.index[form] = ((tier, rank), intent)
+        self.top = min(self.index.values(), key=lambda hit: hit[0])[0] if self.index else None
+        self.pattern = re.compile(rf"(?<!\w)({_trie_pattern(self.index)})(?!\w)") if self.index else None
+
+    def match(self, lower_msg):
+        """Return the best intent for an already-normalized message, or None."""
+        if self.pattern is None:
+            return None
+        best = None
+        for m in self.pattern.finditer(lower_msg):
+            hit = self.index[m.group(1)]
+            if best is None or hit[0] < best[0]:
+                best = hit
+                if best[0] == self.top:
+                    break
+        return best[1] if best else None
+
+def normalize_message(text):
+    return ' '.join(text.lower().replace('’', "'").split())
+
+_router = None
+_router_mtime = None
+_router_checked = 0.0
+_router_lock = threading.Lock()
+ROUTER_RELOAD_CHECK_SECONDS = 1.0
+
+def get_intent_router():
+    """Shared router, rebuilt when custom_knowledge.json's mtime changes."""
+    global _router, _router_mtime, _router_checked
+    now = time.monotonic()
+    if _router is not None and now - _router_checked < ROUTER_RELOAD_CHECK_SECONDS:
+        return _router
+    try:
+        mtime = os.stat(KNOWLEDGE_PATH).st_mtime_ns
+    except OSError:
+        mtime = None
+    with _router_lock:
+        if _router is None or mtime != _router_mtime:
+            knowledge = load_custom_knowledge(KNOWLEDGE_PATH)
+            if knowledge is not None or _router is None:
+                try:
+                    _router = IntentRouter(build_intents(knowledge or []))
+                except Exception:
+                    if _router is None:
+                        raise
+                    log.exception("intent_router_build_failed")
+            # A half-saved JSON file keeps the previous router until it parses again
+            _router_mtime = mtime
+        _router_checked = now
+    return _router
+
+get_intent_router()  # Build once at startup
+
+def local_reply(intent, user_name=None, visited=False):
+    """Render an intent's reply without calling the Assistant."""
+    if intent['name'] == 'greeting':
+        greeting = get_greeting(user_name)
+        if visited:
+            greeting += " (Welcome back!)"
+        return greeting
+    reply = intent['reply']
+    return reply() if callable(reply) else reply
+
 def append_checkout_link_if_needed(reply):
     lower_reply = reply.lower()
     if any(keyword in lower_reply for keyword in PURCHASE_KEYWORDS):
@@ -71,78 +436,1472 @@ def append_checkout_link_if_needed(reply):
             reply = f'{reply}\n\n<a href="{CHECKOUT_LINK}" target="_blank">Buy now</a>'
     return reply
 
-def openai_fallback(user_msg, user_name=None):
+# File-search citations look like 【4:0†events.json】; older replies also leave
+# bare 4:0†events.json or events.json behind. Times like 9:00 are kept.
+CITATION_ARTIFACT = re.compile(r"\d+:\d+†[\w.-]+\.json】?|[\w.-]+\.json|†|【[^】]*】")
+UNCLOSED_CITATION = re.compile(r"【[^】]*$")
+TRAILING_ARTIFACT = re.compile(r"[【】.]+$")
+CITATION_MAX_LENGTH = 64
+
+class CitationSanitizer:
+    """Strip citation artifacts from reply text fed in arbitrary chunks.
+
+    Text is released a word at a time, once the whitespace after the word
+    has arrived, so an artifact split across chunks is always cleaned whole;
+    an open 【 holds text up to its 】, but is dropped as a stray bracket once
+    whitespace or more than CITATION_MAX_LENGTH characters follow it, since a
+    real citation is neither. Whitespace runs collapse to one space, and
+    trailing periods and brackets are held back because the finished reply
+    drops them.
+    """
+
+    def __init__(self):
+        self.word = ''
+        self.in_citation = False
+        self.citation_start = 0
+        self.started = False
+        self.held = ''
+        self.parts = []
+
+    def feed(self, chunk):
+        """Return the clean text that `chunk` makes safe to show."""
+        out = []
+        word = self.word
+        for ch in chunk:
+            if self.in_citation and (ch.isspace() or len(word) - self.citation_start > CITATION_MAX_LENGTH):
+                word = word[:self.citation_start] + word[self.citation_start + 1:]
+                self.in_citation = False
+            if self.in_citation:
+                word += ch
+                self.in_citation = ch != '】'
+            elif ch == '【':
+                self.citation_start = len(word)
+                word += ch
+                self.in_citation = True
+            elif ch.isspace():
+                if word:
+                    out.append(self._release(word))
+                    word = ''
+            else:
+                word += ch
+        self.word = word
+        text = ''.join(out)
+        self.parts.append(text)
+        return text
+
+    def finish(self):
+        """Return whatever is still held back once the reply is complete."""
+        word = UNCLOSED_CITATION.sub('', self.word) if self.in_citation else self.word
+        self.word, self.in_citation = '', False
+        text = self._release(word) if word else ''
+        self.held = ''
+        self.parts.append(text)
+        return text
+
+    @property
+    def text(self):
+        return ''.join(self.parts)
+
+    def _release(self, word):
+        word = CITATION_ARTIFACT.sub('', word)
+        if not word:
+            return ''
+        body = TRAILING_ARTIFACT.sub('', word)
+        sep = ' ' if self.started or self.held else ''
+        if not body:
+            self.held += sep + word
+            return ''
+        out = self.held + sep + body
+        self.held = word[len(body):]
+        self.started = True
+        return out
+
+# --- Assistant Run Engine ---
+ASSISTANT_ID = "asst_S2QbfA9NqgXKgZ8iymO1TjuG"
+RUN_DEADLINE_SECONDS = float(os.getenv('RUN_DEADLINE_SECONDS', '25'))
+RUN_STREAMING = os.getenv('RUN_STREAMING', '1') != '0'
+# Adaptive polling when streaming is off: 0.1s, 0.15s, 0.225s ... capped at 1s
+POLL_INITIAL_DELAY = 0.1
+POLL_BACKOFF = 1.5
+POLL_MAX_DELAY = 1.0
+ACTIVE_RUN_STATUSES = {"queued", "in_progress", "cancelling"}
+PHASE_METRIC = 'canyon_assistant_phase_seconds'
+FAILED_RUN_EVENTS = {"thread.run.failed", "thread.run.cancelled", "thread.run.expired", "thread.run.incomplete", "thread.run.requires_action"}
+
+class AssistantRunError(Exception):
+    """A run failed, was cancelled, or ran past its deadline."""
+
+def _remaining(deadline):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise AssistantRunError("run deadline exceeded")
+    return remaining
+
+def _cancel_run(client, thread_id, run_id):
+    try:
+        client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id, timeout=5)
+    except Exception as e:
+        log.warning("run_cancel_failed", extra={"fields": {"run_id": run_id, "error": str(e)}})
+
+def iter_run_text(client, thread_id, deadline=None, first_token_deadline=None):
+    """Start a run on thread_id and yield the assistant's reply text as it arrives.
+
+    Streams run events when possible, so text is forwarded the moment it is
+    generated and no status polling is needed. Falls back to adaptive
+    backoff polling if streaming is disabled or rejected. Raises
+    AssistantRunError past the deadline, or past first_token_deadline if no
+    text has arrived by then; unfinished runs are cancelled.
+    """
+    import openai
+    if deadline is None:
+        deadline = time.monotonic() + RUN_DEADLINE_SECONDS
+    start_deadline = min(deadline, first_token_deadline) if first_token_deadline else deadline
+    stream = None
+    if RUN_STREAMING:
+        try:
+            with metrics.timer(PHASE_METRIC, phase='run_create'):
+                # The timeout applies to each read, so it also bounds the gaps between events
+                stream = client.beta.threads.runs.create(
+                    thread_id=thread_id, assistant_id=ASSISTANT_ID, stream=True, timeout=_remaining(start_deadline)
+                )
+        except (openai.APIStatusError, TypeError) as e:
+            # TypeError: an SDK too old to accept stream=True
+            log.warning("run_stream_unavailable", extra={"fields": {"error": str(e)}})
+    if stream is not None:
+        yield from _stream_run(client, thread_id, stream, deadline, start_deadline)
+    else:
+        # A polled reply arrives all at once, so its first token is the whole run
+        yield from _poll_run(client, thread_id, start_deadline)
+
+def _stream_run(client, thread_id, stream, deadline, start_deadline):
+    import openai
+    run_id = None
+    finished = False
+    started = time.perf_counter()
+    first_token = True
+    try:
+        for event in stream:
+            if event.event == "thread.run.created":
+                run_id = event.data.id
+            elif event.event == "thread.message.delta":
+                for part in event.data.delta.content or []:
+                    if part.type == "text" and part.text and part.text.value:
+                        if first_token:
+                            metrics.observe(PHASE_METRIC, time.perf_counter() - started, phase='first_token')
+                            first_token = False
+                        yield part.text.value
+            elif event.event == "thread.run.completed":
+                # Keep reading to the end of the body so the connection can be reused
+                finished = True
+            elif event.event in FAILED_RUN_EVENTS:
+                finished = True
+                raise AssistantRunError(f"run ended with {event.event}")
+            _remaining(start_deadline if first_token else deadline)
+        if not finished:
+            raise AssistantRunError("run stream ended early")
+    except openai.APITimeoutError:
+        # The per-request timeout is the time left, so a stalled read means the deadline passed
+        raise AssistantRunError("run deadline exceeded")
+    finally:
+        stream.close()
+        metrics.observe(PHASE_METRIC, time.perf_counter() - started, phase='run')
+        if not finished and run_id:
+            _cancel_run(client, thread_id, run_id)
+
+def _poll_run(client, thread_id, deadline):
+    with metrics.timer(PHASE_METRIC, phase='run_create'):
+        run = client.beta.threads.runs.create(
+            thread_id=thread_id, assistant_id=ASSISTANT_ID, timeout=_remaining(deadline)
+        )
+    delay = POLL_INITIAL_DELAY
+    finished = False
+    started = time.perf_counter()
+    try:
+        while run.status in ACTIVE_RUN_STATUSES:
+            time.sleep(min(delay, _remaining(deadline)))
+            delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+            with metrics.timer(PHASE_METRIC, phase='poll'):
+                run = client.beta.threads.runs.retrieve(
+                    thread_id=thread_id, run_id=run.id, timeout=_remaining(deadline)
+                )
+        finished = True
+    finally:
+        metrics.observe(PHASE_METRIC, time.perf_counter() - started, phase='run')
+        if not finished:
+            _cancel_run(client, thread_id, run.id)
+    if run.status != "completed":
+        raise AssistantRunError(f"run ended with status {run.status}")
+    with metrics.timer(PHASE_METRIC, phase='list'):
+        messages = client.beta.threads.messages.list(thread_id=thread_id, timeout=_remaining(deadline))
+    # Return the latest assistant message
+    for msg in messages.data:
+        if msg.role == "assistant":
+            yield msg.content[0].text.value
+            return
+
+def run_assistant(client, thread_id, deadline=None):
+    """Run the assistant to completion and return its raw reply, or None."""
+    reply = ''.join(iter_run_text(client, thread_id, deadline)).strip()
+    return reply or None
+
+# --- OpenAI Client & Visitor Threads ---
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '64'))
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv('OPENAI_KEEPALIVE_SECONDS', '120'))
+VISITOR_THREADS_MAX = int(os.getenv('VISITOR_THREADS_MAX', '5000'))
+# A visitor quiet for this long starts a fresh conversation
+VISITOR_THREAD_IDLE_SECONDS = float(os.getenv('VISITOR_THREAD_IDLE_SECONDS', str(3 * 60 * 60)))
+
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+def get_openai_client():
+    """Process-wide client so requests reuse warm keep-alive connections."""
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                import httpx2
+                import openai
+                # openai 3.x (see requirements.txt) is built on httpx2
+                limits = httpx2.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                    keepalive_expiry=OPENAI_KEEPALIVE_SECONDS,
+                )
+                _openai_client = openai.OpenAI(
+                    api_key=OPENAI_API_KEY,
+                    timeout=20.0,
+                    http_client=openai.DefaultHttpxClient(limits=limits),
+                )
+    return _openai_client
+
+class VisitorThreads:
+    """Visitor key -> Assistant thread id, LRU-bounded with idle expiry.
+
+    Keys are "sms:<From number>" or "web:<session visitor id>". The
+    Assistants API rejects new messages while a run is active on a thread,
+    so each visitor's conversation is locked for the length of a reply.
+    """
+
+    def __init__(self, max_visitors, idle_seconds):
+        self.max_visitors = max_visitors
+        self.idle_seconds = idle_seconds
+        self.entries = OrderedDict()  # visitor -> {"thread_id", "last_used", "lock"}
+        self.lock = threading.Lock()
+        self.stats = {"reused": 0, "created": 0, "expired": 0, "evicted": 0}
+
+    def _expire(self, now):
+        while self.entries:
+            visitor, entry = next(iter(self.entries.items()))
+            if now - entry["last_used"] < self.idle_seconds:
+                break
+            del self.entries[visitor]
+            self.stats["expired"] += 1
+
+    def has_thread(self, visitor):
+        if not visitor:
+            return False
+        with self.lock:
+            self._expire(time.monotonic())
+            entry = self.entries.get(visitor)
+            return entry is not None and entry["thread_id"] is not None
+
+    def acquire(self, visitor, timeout):
+        """Lock and return the visitor's entry, or None if their previous reply is still running."""
+        with self.lock:
+            now = time.monotonic()
+            self._expire(now)
+            entry = self.entries.get(visitor)
+            if entry is None:
+                entry = self.entries[visitor] = {"thread_id": None, "last_used": now, "lock": threading.Lock()}
+                while len(self.entries) > self.max_visitors:
+                    self.entries.popitem(last=False)
+                    self.stats["evicted"] += 1
+            self.entries.move_to_end(visitor)
+        if not entry["lock"].acquire(timeout=timeout):
+            return None
+        return entry
+
+    def release(self, entry, reused):
+        with self.lock:
+            entry["last_used"] = time.monotonic()
+            self.stats["reused" if reused else "created"] += 1
+        entry["lock"].release()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, visitors=len(self.entries))
+
+visitor_threads = VisitorThreads(VISITOR_THREADS_MAX, VISITOR_THREAD_IDLE_SECONDS)
+
+def openai_fallback(user_msg, user_name=None, visitor=None, deadline=None):
+    """The Assistant's reply, or None if it failed.
+
+    Raises LoadShed when admission control turns the request away or the
+    run overruns `deadline` (default: AI_LATENCY_BUDGET_SECONDS from now).
+    """
     if not OPENAI_API_KEY:
         return None
-    import time
-    ASSISTANT_ID = "asst_S2QbfA9NqgXKgZ8iymO1TjuG"
+    if deadline is None:
+        deadline = time.monotonic() + AI_LATENCY_BUDGET_SECONDS
+    now = datetime.now()
+    # Named visitors and ongoing conversations get answers that must not be shared
+    if user_name or REPLY_CACHE_MAX_ENTRIES <= 0 or visitor_threads.has_thread(visitor):
+        return _openai_reply(user_msg, user_name, now, visitor, deadline)
+    key, ttl = reply_cache_key(user_msg, now)
+    return reply_cache.get_or_compute(key, ttl, lambda: _openai_reply(user_msg, None, now, visitor, deadline),
+                                      deadline)
+
+def openai_fallback_stream(user_msg, user_name=None, visitor=None, first_token_deadline=None):
+    """Like openai_fallback, but yields the reply in pieces as the run produces it.
+
+    The latency budget (first_token_deadline, default
+    AI_LATENCY_BUDGET_SECONDS from now) only covers the wait for the first
+    piece; once text is flowing the run has RUN_DEADLINE_SECONDS in all.
+    Cacheable questions still go through the reply cache and arrive in one
+    piece. Yields nothing if the AI is unavailable and raises LoadShed if
+    the reply can't start in time. A reply that breaks off after text was
+    yielded raises AssistantRunError.
+    """
+    if not OPENAI_API_KEY:
+        return
+    now = time.monotonic()
+    if first_token_deadline is None:
+        first_token_deadline = now + AI_LATENCY_BUDGET_SECONDS
+    if user_name or REPLY_CACHE_MAX_ENTRIES <= 0 or visitor_threads.has_thread(visitor):
+        deadline = max(first_token_deadline, now + RUN_DEADLINE_SECONDS)
+        started = False
+        try:
+            for piece in iter_openai_reply(user_msg, user_name, datetime.now(), visitor, deadline,
+                                           first_token_deadline):
+                started = True
+                yield piece
+        except LoadShed:
+            raise
+        except Exception as e:
+            if started:
+                log.warning("openai_stream_cut_off", extra={"fields": {"error": str(e)}})
+                raise AssistantRunError(f"reply cut off: {e}") from e
+            _raise_if_over_budget(first_token_deadline)
+            log.exception("openai_error")
+        return
+    reply = openai_fallback(user_msg, None, visitor, first_token_deadline)
+    if reply:
+        yield reply
+
+def _openai_reply(user_msg, user_name, now, visitor=None, deadline=None):
+    try:
+        return ''.join(iter_openai_reply(user_msg, user_name, now, visitor, deadline)) or None
+    except LoadShed:
+        raise
+    except Exception:
+        _raise_if_over_budget(deadline)
+        log.exception("openai_error")
+        return None
+
+def _raise_if_over_budget(deadline):
+    # A run that failed because time ran out is shed, not an error
+    if deadline is not None and time.monotonic() >= deadline:
+        raise admission.shed("budget")
+
+def iter_openai_reply(user_msg, user_name, now, visitor=None, deadline=None, first_token_deadline=None):
+    """Ask the Assistant and yield its cleaned reply as it streams in.
+
+    Citation artifacts are stripped on the fly and the checkout link is
+    appended at the end. The run holds an admission slot throughout. With
+    first_token_deadline, everything up to the first text (queueing for a
+    slot, the visitor's thread, the run starting) must fit before it.
+    Errors propagate after the visitor's thread is reset.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + RUN_DEADLINE_SECONDS
+    start_deadline = min(deadline, first_token_deadline) if first_token_deadline else deadline
+    with admission.admit(visitor, start_deadline):
+        yield from _iter_openai_reply(user_msg, user_name, now, visitor, deadline, start_deadline)
+
+def _iter_openai_reply(user_msg, user_name, now, visitor, deadline, start_deadline):
+    entry = visitor_threads.acquire(visitor, max(0.0, start_deadline - time.monotonic())) if visitor else None
+    thread_id = entry["thread_id"] if entry else None
+    reused = thread_id is not None
     try:
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        client = get_openai_client()
         # Personalize user message if user_name is present
         if user_name:
             user_msg = f"Visitor name: {user_name}.\n" + user_msg
         # Inject current local time for all queries
-        import datetime
-        now = datetime.datetime.now().strftime("%A, %B %d, %Y at %H:%M")
-        user_msg += f"\n\nCurrent local time is {now}."
-        # Create a thread for the conversation (stateless for now)
-        thread = client.beta.threads.create()
-        thread_id = thread.id
-        # Add user message
-        client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=user_msg
-        )
-        # Run the assistant
-        run = client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=ASSISTANT_ID
-        )
-        # Poll for completion
-        while run.status not in ["completed", "failed"]:
-            time.sleep(1)
-            run = client.beta.threads.runs.retrieve(
-                thread_id=thread_id,
-                run_id=run.id
+        user_msg += f"\n\nCurrent local time is {now.strftime('%A, %B %d, %Y at %H:%M')}."
+        if thread_id:
+            # Returning visitor: continue their conversation
+            with metrics.timer(PHASE_METRIC, phase='message_create'):
+                client.beta.threads.messages.create(thread_id=thread_id, role="user", content=user_msg)
+        else:
+            # New visitor: create the thread and its first message in one round trip
+            with metrics.timer(PHASE_METRIC, phase='thread_create'):
+                thread_id = client.beta.threads.create(messages=[{"role": "user", "content": user_msg}]).id
+            if entry:
+                entry["thread_id"] = thread_id
+        sanitizer = CitationSanitizer()
+        for delta in iter_run_text(client, thread_id, deadline, start_deadline):
+            text = sanitizer.feed(delta)
+            if text:
+                yield text
+        text = sanitizer.finish()
+        if text:
+            yield text
+        reply = sanitizer.text
+        if reply:
+            # Checkout link goes last, once we know what the reply talked about
+            link = append_checkout_link_if_needed(reply)[len(reply):]
+            if link:
+                yield link
+    except Exception:
+        if entry:
+            # The thread may be gone or stuck; start the next message fresh
+            entry["thread_id"] = None
+        raise
+    finally:
+        if entry:
+            visitor_threads.release(entry, reused)
+
+# --- Admission Control ---
+# At most this many Assistant runs at once per worker process, and at most
+# AI_MAX_QUEUED requests waiting for one. Together they must stay below
+# GUNICORN_THREADS so local answers always find a free thread.
+AI_MAX_CONCURRENT_RUNS = int(os.getenv('AI_MAX_CONCURRENT_RUNS', '16'))
+AI_MAX_QUEUED = int(os.getenv('AI_MAX_QUEUED', '8'))
+AI_QUEUE_WAIT_SECONDS = float(os.getenv('AI_QUEUE_WAIT_SECONDS', '2'))
+# Time an inline (webhook or web) reply may spend on the AI; Twilio gives up after 15s
+AI_LATENCY_BUDGET_SECONDS = float(os.getenv('AI_LATENCY_BUDGET_SECONDS', '12'))
+# Per sender (phone number or browser session): a refill rate and a burst allowance;
+# a rate of 0 turns the per-sender limit off
+AI_SENDER_RATE_PER_MINUTE = float(os.getenv('AI_SENDER_RATE_PER_MINUTE', '6'))
+AI_SENDER_BURST = float(os.getenv('AI_SENDER_BURST', '3'))
+
+class LoadShed(Exception):
+    """An AI reply was turned away or ran out of time; answer locally instead."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+class AdmissionController:
+    """Gate in front of Assistant runs: per-sender token buckets, then a capped run pool.
+
+    A request that finds every run slot busy waits in a short, bounded
+    queue; one that is over its sender's rate, finds the queue full, or
+    cannot get a slot before its wait or deadline runs out raises LoadShed.
+    """
+
+    def __init__(self, max_runs, max_queued, rate_per_minute, burst, max_senders=VISITOR_THREADS_MAX):
+        self.max_runs = max_runs
+        self.max_queued = max_queued
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_senders = max_senders
+        self.buckets = OrderedDict()  # sender -> (tokens, updated_at)
+        self.running = 0
+        self.queued = 0
+        self.cond = threading.Condition()
+        self.stats = {"admitted": 0, "shed_rate_limited": 0, "shed_queue_full": 0, "shed_queue_timeout": 0,
+                      "shed_budget": 0}
+
+    @contextmanager
+    def admit(self, sender, deadline):
+        """Hold a run slot for the duration of the block, or raise LoadShed."""
+        self._acquire(sender, deadline)
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.running -= 1
+                self.cond.notify()
+
+    def shed(self, reason):
+        """Count a request shed outside the gate (e.g. its run overran the budget)."""
+        with self.cond:
+            self.stats[f"shed_{reason}"] += 1
+        return LoadShed(reason)
+
+    def _acquire(self, sender, deadline):
+        with self.cond:
+            now = time.monotonic()
+            if sender and self.rate > 0 and not self._take_token(sender, now):
+                self.stats["shed_rate_limited"] += 1
+                raise LoadShed("rate_limited")
+            if self.running >= self.max_runs:
+                if self.queued >= self.max_queued:
+                    self.stats["shed_queue_full"] += 1
+                    raise LoadShed("queue_full")
+                wait_until = min(deadline, now + AI_QUEUE_WAIT_SECONDS)
+                self.queued += 1
+                try:
+                    while self.running >= self.max_runs:
+                        remaining = wait_until - time.monotonic()
+                        if remaining <= 0:
+                            self.stats["shed_queue_timeout"] += 1
+                            raise LoadShed("queue_timeout")
+                        self.cond.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.running += 1
+            self.stats["admitted"] += 1
+
+    def _take_token(self, sender, now):
+        tokens, updated = self.buckets.pop(sender, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self.buckets[sender] = (tokens, now)
+            return False
+        self.buckets[sender] = (tokens - 1, now)
+        while len(self.buckets) > self.max_senders:
+            self.buckets.popitem(last=False)
+        return True
+
+    def snapshot(self):
+        with self.cond:
+            return dict(self.stats, running=self.running, queued=self.queued, senders=len(self.buckets),
+                        shed=sum(v for k, v in self.stats.items() if k.startswith("shed_")))
+
+admission = AdmissionController(AI_MAX_CONCURRENT_RUNS, AI_MAX_QUEUED, AI_SENDER_RATE_PER_MINUTE, AI_SENDER_BURST)
+
+DEGRADED_WORD = re.compile(r"[a-z]{4,}")
+_degraded_index = (None, [])
+
+def _degraded_candidates():
+    """(words, reply) for every exhibition, event and knowledge entry, rebuilt with the router."""
+    global _degraded_index
+    router = get_intent_router()
+    if _degraded_index[0] is not router:
+        candidates = []
+        for ex in EXHIBITIONS:
+            reply = f"*{ex['title']}* — {ex['desc']} (Gallery {ex['gallery']})"
+            candidates.append((set(DEGRADED_WORD.findall(f"{ex['title']} {ex['desc']}".lower())), reply))
+        for event in EVENTS:
+            reply = f"{event['name']} is at {event['time']} in {event['location']}."
+            candidates.append((set(DEGRADED_WORD.findall(f"{event['name']} {event['location']}".lower())), reply))
+        for intent in router.intents:
+            if intent['name'].startswith('knowledge:'):
+                text = ' '.join(intent['keywords']) + ' ' + intent['reply']
+                candidates.append((set(DEGRADED_WORD.findall(text.lower())), intent['reply']))
+        _degraded_index = (router, candidates)
+    return _degraded_index[1]
+
+# Built now so the first shed request doesn't pay for it
+_degraded_candidates()
+
+def degraded_reply(user_msg, now=None):
+    """Instant local stand-in for an AI answer when the Assistant is too busy.
+
+    Picks the exhibition, event or custom knowledge entry sharing the most
+    words with the message; with no overlap, suggests the next event and an
+    exhibition.
+    """
+    words = set(DEGRADED_WORD.findall(normalize_message(user_msg or '')))
+    best, best_score = None, 0
+    for candidate_words, reply in _degraded_candidates():
+        score = len(words & candidate_words)
+        if score > best_score:
+            best, best_score = reply, score
+    if best:
+        return f"I'm juggling a lot of questions right now, so here's the quick version: {best}"
+    now = now or datetime.now()
+    upcoming = [e for e in EVENTS if datetime.strptime(e['time'], '%I:%M %p').time() >= now.time()]
+    event = upcoming[0] if upcoming else None
+    reply = "I'm juggling a lot of questions right now! "
+    if event:
+        reply += f"Next up: {event['name']} at {event['time']} in {event['location']}. "
+    return reply + f"Meanwhile, try {suggest_exhibition()}. Ask me again in a minute for more."
+
+# --- Reply Cache ---
+REPLY_CACHE_MAX_ENTRIES = int(os.getenv('REPLY_CACHE_MAX_ENTRIES', '1000'))
+REPLY_CACHE_MAX_BYTES = int(os.getenv('REPLY_CACHE_MAX_BYTES', str(1024 * 1024)))
+# Answers only depend on the injected local time at about this granularity
+# ("what's on now?" changes with the hour, not the minute)
+REPLY_CACHE_BUCKET_MINUTES = int(os.getenv('REPLY_CACHE_BUCKET_MINUTES', '60'))
+CACHE_KEY_PUNCTUATION = re.compile(r"[^\w\s]")
+# A single-flight leader shed for lack of time or run capacity passes that
+# on to the callers waiting on it; a rate-limited leader only speaks for
+# its own sender
+SHARED_SHED_REASONS = {"budget", "queue_full", "queue_timeout"}
+
+def reply_cache_key(user_msg, now):
+    """Cache key for a question asked at `now`, and seconds until its time bucket ends."""
+    question = ' '.join(CACHE_KEY_PUNCTUATION.sub('', normalize_message(user_msg)).split())
+    minute_of_day = now.hour * 60 + now.minute
+    bucket_start = minute_of_day - minute_of_day % REPLY_CACHE_BUCKET_MINUTES
+    ttl = (bucket_start + REPLY_CACHE_BUCKET_MINUTES - minute_of_day) * 60 - now.second
+    return f"{now:%Y-%m-%d}@{bucket_start}|{question}", max(ttl, 1)
+
+class ReplyCache:
+    """LRU + TTL cache of Assistant replies with single-flight misses.
+
+    Concurrent misses for the same key wait on the first caller's run,
+    each for no longer than its own deadline, instead of starting their
+    own. Failed runs are never stored. A None reply, or a shed for lack of
+    time or capacity, is shared with the waiters. If the first caller was
+    turned away for its own reasons (its sender's rate limit), the waiters
+    start over and one of them runs instead. Bounded by entry count and by
+    the UTF-8 size of keys plus replies.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (expires_at, reply, size, compute_seconds)
+        self.in_flight = {}
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expired": 0, "saved_seconds": 0.0}
+
+    def get_or_compute(self, key, ttl, compute, deadline=None):
+        while True:
+            found, reply = self._lookup(key, ttl, compute, deadline)
+            if found:
+                return reply
+
+    def _lookup(self, key, ttl, compute, deadline):
+        """(True, reply), or (False, None) when the flight we waited on was abandoned."""
+        leader = False
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["saved_seconds"] += entry[3]
+                    return True, entry[1]
+                self._remove(key)
+                self.stats["expired"] += 1
+            flight = self.in_flight.get(key)
+            if flight is not None:
+                self.stats["coalesced"] += 1
+            else:
+                flight = self.in_flight[key] = {"done": threading.Event(), "reply": None, "error": None,
+                                                "abandoned": False}
+                self.stats["misses"] += 1
+                leader = True
+        if not leader:
+            timeout = deadline - time.monotonic() if deadline is not None else RUN_DEADLINE_SECONDS + 5
+            if not flight["done"].wait(max(0.0, timeout)):
+                # Out of our own time; the leader's run carries on and is still cached
+                if deadline is not None:
+                    raise admission.shed("budget")
+                return True, None
+            if flight["abandoned"]:
+                return False, None
+            if flight["error"] is not None:
+                raise admission.shed(flight["error"].reason)
+            return True, flight["reply"]
+        started = time.monotonic()
+        try:
+            flight["reply"] = compute()
+        except LoadShed as e:
+            if e.reason in SHARED_SHED_REASONS:
+                flight["error"] = e
+            else:
+                flight["abandoned"] = True
+            raise
+        except BaseException:
+            flight["abandoned"] = True
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            with self.lock:
+                del self.in_flight[key]
+                if flight["reply"] is not None:
+                    self._store(key, flight["reply"], ttl, elapsed)
+            flight["done"].set()
+        return True, flight["reply"]
+
+    def _store(self, key, reply, ttl, elapsed):
+        size = len(key.encode()) + len(reply.encode())
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic() + ttl, reply, size, elapsed)
+        self.size += size
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key)[2]
+
+    def snapshot(self):
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+            return dict(
+                self.stats,
+                entries=len(self.entries),
+                bytes=self.size,
+                in_flight=len(self.in_flight),
+                hit_rate=(self.stats["hits"] + self.stats["coalesced"]) / lookups if lookups else 0.0,
             )
-        if run.status == "completed":
-            messages = client.beta.threads.messages.list(thread_id=thread_id)
-            # Return the latest assistant message
-            for msg in messages.data:
-                if msg.role == "assistant":
-                    reply = msg.content[0].text.value.strip()
-                    # Post-process to remove RAG citation artifacts
-                    import re
-                    # Remove patterns like 4:0†filename.json】, numbers:filename.json, etc.
-                    reply = re.sub(r"\d+:\d+†[\w_.-]+\.json】?", "", reply)
-                    # Do NOT remove \d+:\d+ patterns (to preserve times like 9:00PM)
-                    reply = re.sub(r"[\w_.-]+\.json", "", reply)  # Remove any .json file references
-                    reply = re.sub(r"†", "", reply)  # Remove stray daggers
-                    # Remove any text inside 【 ... 】 brackets (including the brackets)
-                    reply = re.sub(r"【[^】]*】", "", reply)
-                    reply = re.sub(r"\s+", " ", reply).strip()  # Normalize whitespace
-                    # Remove any trailing or standalone '【', '】', or '【.' at the end
-                    reply = re.sub(r"[【】.]+$", "", reply).strip()
-                    # Append checkout link if relevant
-                    reply = append_checkout_link_if_needed(reply)
-                    return reply
-        return None
+
+reply_cache = ReplyCache(REPLY_CACHE_MAX_ENTRIES, REPLY_CACHE_MAX_BYTES)
+
+STOP_REPLY = "Understood. I’ll step back. If you need me, just text again. 🌙"
+AI_UNAVAILABLE_REPLY = "Sorry, I couldn't get a response from the AI right now."
+
+def local_answer(user_msg, user_name=None, visited=False):
+    """(branch, reply) for stop words or a locally known intent; reply is None if it needs the AI."""
+    lower_msg = normalize_message(user_msg) if user_msg else ''
+    if lower_msg in ['stop', 'leave me alone']:
+        return 'stop', STOP_REPLY
+    intent = get_intent_router().match(lower_msg)
+    if intent is not None:
+        return intent_branch(intent), local_reply(intent, user_name, visited)
+    return 'ai_fallback', None
+
+def answer_message(user_msg, user_name=None, visited=False, visitor=None, deadline=None):
+    """(branch, reply), asking the Assistant when nothing local matches."""
+    branch, reply = local_answer(user_msg, user_name, visited)
+    if reply is None:
+        try:
+            reply = openai_fallback(user_msg, user_name, visitor, deadline) or AI_UNAVAILABLE_REPLY
+        except LoadShed:
+            branch, reply = 'degraded', degraded_reply(user_msg)
+    return branch, reply
+
+def intent_branch(intent):
+    # "knowledge:3" -> "knowledge", so metric labels stay few
+    return intent['name'].split(':', 1)[0]
+
+def observe_reply(route, branch, started, **fields):
+    """Record a handled message in the latency histograms and the sampled request log."""
+    elapsed = time.perf_counter() - started
+    metrics.observe('canyon_reply_seconds', elapsed, route=route, branch=branch)
+    log_event("reply", sampled=elapsed < LOG_SLOW_SECONDS, route=route, branch=branch,
+              ms=round(elapsed * 1000, 1), **fields)
+
+# --- Async Twilio Replies ---
+# Opt-in: acknowledge Twilio webhooks with empty TwiML and send the reply
+# through the Messaging API once it is ready.
+TWILIO_ASYNC_REPLIES = os.getenv('TWILIO_ASYNC_REPLIES', '0') == '1'
+TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
+TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
+TWILIO_FROM_NUMBER = os.getenv('TWILIO_FROM_NUMBER')
+TWILIO_API_BASE = os.getenv('TWILIO_API_BASE', 'https://api.twilio.com')
+SMS_WORKERS = int(os.getenv('SMS_WORKERS', '16'))
+SMS_SEND_RETRIES = int(os.getenv('SMS_SEND_RETRIES', '3'))
+SMS_POLL_SECONDS = 2.0
+# A reply claimed longer ago than this by a worker that never finished it
+# (crashed, restarted) is claimed again; it may then be sent twice
+SMS_CLAIM_STALE_SECONDS = RUN_DEADLINE_SECONDS + 60
+# Finished replies are kept this long so Twilio's webhook retries are still recognised
+SMS_JOB_RETENTION_SECONDS = 24 * 60 * 60
+SMS_PRUNE_SECONDS = 60
+EMPTY_TWIML = "<?xml version='1.0' encoding='UTF-8'?><Response></Response>"
+
+if TWILIO_ASYNC_REPLIES and not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN):
+    # Every reply would be acknowledged to Twilio and then dropped
+    raise RuntimeError("TWILIO_ASYNC_REPLIES=1 needs TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN")
+
+class SmsSendError(Exception):
+    def __init__(self, message, retryable=True, status=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status = status
+
+class _StaleConnection(Exception):
+    """A reused keep-alive connection turned out to be closed before our request reached the server."""
+
+class TwilioMessagingClient:
+    """Minimal client for Twilio's Create Message endpoint.
+
+    Each sending thread keeps its own keep-alive connection, so a burst of
+    sends pays for one TLS handshake per thread rather than per message.
+    """
+
+    def __init__(self, account_sid, auth_token, api_base=TWILIO_API_BASE, timeout=10):
+        url = urllib.parse.urlsplit(api_base)
+        self.connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = url.netloc
+        self.path = f"{url.path.rstrip('/')}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        token = base64.b64encode(f"{account_sid}:{auth_token}".encode()).decode()
+        self.headers = {"Authorization": f"Basic {token}", "Content-Type": "application/x-www-form-urlencoded"}
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def send(self, to, from_, body):
+        data = urllib.parse.urlencode({"To": to, "From": from_, "Body": body}).encode()
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            try:
+                return self._post(conn, data)
+            except _StaleConnection:
+                # The server closed the idle keep-alive connection without reading
+                # our request, so nothing was sent; one try on a fresh connection
+                pass
+        return self._post(None, data)
+
+    def _post(self, conn, data):
+        reused = conn is not None
+        sent = False
+        try:
+            if conn is None:
+                conn = self.local.conn = self.connection_class(self.netloc, timeout=self.timeout)
+                conn.connect()
+                # http.client writes headers and body separately; don't let Nagle
+                # hold the body back until the server ACKs the headers
+                conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.request("POST", self.path, body=data, headers=self.headers)
+            sent = True
+            resp = conn.getresponse()
+            status, payload = resp.status, resp.read()
+        except BaseException as e:
+            if conn is not None:
+                conn.close()
+            self.local.conn = None
+            if not isinstance(e, (http.client.HTTPException, OSError)):
+                raise
+            if reused and (isinstance(e, http.client.RemoteDisconnected)
+                           or (not sent and isinstance(e, (BrokenPipeError, ConnectionResetError)))):
+                raise _StaleConnection() from e
+            # Once the request is out (e.g. a read timeout) Twilio may have accepted
+            # it, and sending it again could deliver the message twice
+            raise SmsSendError(str(e), retryable=not sent) from e
+        if status >= 400:
+            # 429 and 5xx are worth retrying; other 4xx (bad number, auth) are not
+            raise SmsSendError(f"Twilio returned {status}", retryable=status == 429 or status >= 500, status=status)
+        return json.loads(payload or b"{}").get("sid")
+
+class SmsReplyDispatcher:
+    """Background workers that compute replies and send them as outbound SMS.
+
+    Queued replies live in the shared SQLite store (see BroadcastStore), so
+    every gunicorn worker drains one queue. A number's next reply is only
+    claimed once its previous one is finished, so replies go out in the
+    order the messages arrived while different numbers proceed in parallel.
+    Twilio retries webhooks it thinks failed; a MessageSid already queued by
+    any worker is dropped. A reply claimed by a worker that died before
+    finishing it is claimed again after SMS_CLAIM_STALE_SECONDS.
+    """
+
+    def __init__(self, messenger, store, workers=SMS_WORKERS, answer=answer_message):
+        self.messenger = messenger
+        self.store = store
+        self.answer = answer
+        # Wake-up tokens: one per submitted or finished reply. Replies queued by
+        # other processes are found by polling every SMS_POLL_SECONDS.
+        self.wake = queue.Queue()
+        self.lock = threading.Lock()
+        self.pruned_at = 0.0
+        self.stats = {"queued": 0, "duplicates": 0, "sent": 0, "retries": 0, "failed": 0, "recovered": 0}
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def has_pending(self, number):
+        return self.store.reply_pending(number)
+
+    def submit(self, message_sid, to, from_, body, reply=None):
+        """Queue a reply to `to`; reply=None means compute it in the worker. False if a duplicate."""
+        if not self.store.enqueue_reply(message_sid, to, from_ or TWILIO_FROM_NUMBER, body, reply):
+            with self.lock:
+                self.stats["duplicates"] += 1
+            return False
+        with self.lock:
+            self.stats["queued"] += 1
+        self.wake.put(None)
+        return True
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                log.exception("sms_claim_error")
+                job = None
+            if job is None:
+                try:
+                    self.wake.get(timeout=SMS_POLL_SECONDS)
+                except queue.Empty:
+                    pass
+                continue
+            status = 'failed'
+            try:
+                started = time.perf_counter()
+                if job["reply"] is not None:
+                    reply = job["reply"]
+                else:
+                    # Out of band, so no webhook is waiting: allow the full run deadline
+                    branch, reply = self.answer(job["body"], visitor=f"sms:{job['to']}",
+                                                deadline=time.monotonic() + RUN_DEADLINE_SECONDS)
+                    observe_reply('sms_async', branch, started)
+                status = self._send(job, reply)
+            except Exception:
+                log.exception("sms_dispatch_error", extra={"fields": {"sid": job["sid"]}})
+            finally:
+                try:
+                    self.store.finish_reply(job["id"], status)
+                except sqlite3.Error:
+                    log.exception("sms_claim_error")
+                # The number's next reply can be claimed now
+                self.wake.put(None)
+
+    def _claim(self):
+        now = time.time()
+        job, recovered = self.store.claim_reply(now, now - SMS_CLAIM_STALE_SECONDS)
+        with self.lock:
+            self.stats["recovered"] += recovered
+            prune = now - self.pruned_at > SMS_PRUNE_SECONDS
+            if prune:
+                self.pruned_at = now
+        if prune:
+            self.store.prune_replies(now - SMS_JOB_RETENTION_SECONDS)
+        return job
+
+    def _send(self, job, reply):
+        for attempt in range(SMS_SEND_RETRIES + 1):
+            try:
+                self.messenger.send(job["to"], job["from"], reply)
+                with self.lock:
+                    self.stats["sent"] += 1
+                return 'sent'
+            except SmsSendError as e:
+                if not e.retryable or attempt == SMS_SEND_RETRIES:
+                    with self.lock:
+                        self.stats["failed"] += 1
+                    log.error("sms_send_failed", extra={"fields": {"sid": job["sid"], "to": job["to"], "error": str(e)}})
+                    return 'failed'
+                with self.lock:
+                    self.stats["retries"] += 1
+                time.sleep(0.5 * 2 ** attempt)
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+        return dict(stats, pending=self.store.replies_pending())
+
+_sms_dispatcher = None
+_sms_dispatcher_lock = threading.Lock()
+
+def get_sms_dispatcher():
+    """Shared dispatcher, started on first use so its threads exist in each gunicorn worker."""
+    global _sms_dispatcher
+    if _sms_dispatcher is None:
+        store = get_broadcast_store()
+        with _sms_dispatcher_lock:
+            if _sms_dispatcher is None:
+                _sms_dispatcher = SmsReplyDispatcher(TwilioMessagingClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
+                                                     store)
+    return _sms_dispatcher
+
+def visitor_key(twilio_mode=False):
+    """Who is talking: the sender's number for Twilio, otherwise the browser session."""
+    if twilio_mode and request.form.get('From'):
+        return f"sms:{request.form['From']}"
+    if 'visitor_id' not in session:
+        session['visitor_id'] = uuid.uuid4().hex
+    return f"web:{session['visitor_id']}"
+
+# --- Broadcasts ---
+# Admin and scheduled SMS to everyone who has texted us and not opted out.
+# Visitors, opt-outs and broadcast progress live in SQLite, so every
+# gunicorn worker sees the same lists and only one of them sends each
+# broadcast.
+BROADCAST_DB = os.getenv('BROADCAST_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'canyon.db'))
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+BROADCAST_WORKERS = int(os.getenv('BROADCAST_WORKERS', '8'))
+# Messages per second the sending number is allowed; Twilio answers 429 above it
+BROADCAST_RATE_PER_SECOND = float(os.getenv('BROADCAST_RATE_PER_SECOND', '10'))
+BROADCAST_BATCH_SIZE = 500
+BROADCAST_RATE_LIMIT_PAUSE = 1.0
+BROADCAST_SCHEDULER_SECONDS = 30
+# A sending broadcast records its progress this often; one silent for
+# BROADCAST_STALE_SECONDS belonged to a worker that died and is marked interrupted
+BROADCAST_HEARTBEAT_SECONDS = 10
+BROADCAST_STALE_SECONDS = 6 * BROADCAST_HEARTBEAT_SECONDS
+EVENT_REMINDERS = os.getenv('EVENT_REMINDERS', '0') == '1'
+EVENT_REMINDER_MINUTES = int(os.getenv('EVENT_REMINDER_MINUTES', '15'))
+BROADCAST_TEMPLATES = {
+    "reminder": "⏰ {name} starts in {minutes} minutes in {location}. Reply STOP to opt out.",
+    "today": "🎨 Today at Canyon: {name} at {time} in {location}. Reply STOP to opt out.",
+}
+
+BROADCAST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS visitors (number TEXT PRIMARY KEY, first_seen REAL NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS opt_outs (number TEXT PRIMARY KEY, opted_out_at REAL NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id TEXT PRIMARY KEY,
+    dedupe_key TEXT UNIQUE,
+    body TEXT NOT NULL,
+    from_number TEXT NOT NULL,
+    recipients TEXT,
+    status TEXT NOT NULL,
+    send_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    updated_at REAL,
+    finished_at REAL,
+    total INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS broadcasts_due ON broadcasts (status, send_at);
+CREATE TABLE IF NOT EXISTS sms_replies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sid TEXT UNIQUE,
+    number TEXT NOT NULL,
+    from_number TEXT,
+    body TEXT NOT NULL,
+    reply TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS sms_replies_number ON sms_replies (number, id);
+CREATE INDEX IF NOT EXISTS sms_replies_status ON sms_replies (status, id);
+"""
+BROADCAST_FIELDS = ("id", "body", "from_number", "status", "send_at", "created_at", "started_at", "updated_at",
+                    "finished_at", "total", "sent", "failed", "skipped", "retries")
+
+def render_broadcast(template, event=None, **fields):
+    """Fill a template (a BROADCAST_TEMPLATES name or a literal) from an EVENTS entry and extra fields."""
+    template = BROADCAST_TEMPLATES.get(template, template)
+    return template.format_map(dict(event or {}, **fields))
+
+class BroadcastStore:
+    """SQLite tables for SMS visitors, opt-outs, broadcasts and queued async replies.
+
+    Phone numbers are primary keys, so checking a batch of recipients
+    against the opt-out list is one indexed query. One connection is
+    shared under a lock; WAL lets other worker processes read meanwhile.
+    """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.known = set()  # numbers this process has already recorded
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(BROADCAST_SCHEMA)
+            # Databases created before heartbeats were recorded
+            if not any(col[1] == 'updated_at' for col in self.db.execute("PRAGMA table_info(broadcasts)")):
+                self.db.execute("ALTER TABLE broadcasts ADD COLUMN updated_at REAL")
+
+    def remember(self, number):
+        if number in self.known:
+            return
+        with self.lock:
+            self.db.execute("INSERT OR IGNORE INTO visitors VALUES (?, ?)", (number, time.time()))
+            if len(self.known) >= VISITOR_THREADS_MAX * 10:
+                self.known.clear()
+            self.known.add(number)
+
+    def add_visitors(self, numbers):
+        with self.lock:
+            now = time.time()
+            self.db.execute("BEGIN")
+            self.db.executemany("INSERT OR IGNORE INTO visitors VALUES (?, ?)", ((n, now) for n in numbers))
+            self.db.execute("COMMIT")
+
+    def opt_out(self, number):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO opt_outs VALUES (?, ?)", (number, time.time()))
+
+    def opted_out(self, numbers):
+        """The subset of `numbers` on the opt-out list."""
+        found = set()
+        with self.lock:
+            for i in range(0, len(numbers), BROADCAST_BATCH_SIZE):
+                chunk = numbers[i:i + BROADCAST_BATCH_SIZE]
+                rows = self.db.execute(
+                    f"SELECT number FROM opt_outs WHERE number IN ({','.join('?' * len(chunk))})", chunk)
+                found.update(r[0] for r in rows)
+        return found
+
+    def audience(self):
+        """Every recorded visitor who hasn't opted out."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT v.number FROM visitors v LEFT JOIN opt_outs o ON o.number = v.number WHERE o.number IS NULL")
+            return [r[0] for r in rows]
+
+    def create(self, body, from_number, send_at, recipients=None, dedupe_key=None):
+        """Schedule a broadcast; returns its id, or None if dedupe_key was already used."""
+        broadcast_id = uuid.uuid4().hex[:12]
+        with self.lock:
+            cur = self.db.execute(
+                "INSERT OR IGNORE INTO broadcasts (id, dedupe_key, body, from_number, recipients, status, send_at,"
+                " created_at) VALUES (?, ?, ?, ?, ?, 'scheduled', ?, ?)",
+                (broadcast_id, dedupe_key, body, from_number,
+                 json.dumps(recipients) if recipients is not None else None, send_at, time.time()))
+        return broadcast_id if cur.rowcount else None
+
+    def unfinished(self):
+        """True if any broadcast is scheduled or sending."""
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM broadcasts WHERE status IN ('scheduled', 'sending')"
+                                   " LIMIT 1").fetchone() is not None
+
+    def interrupt_stale(self, now, before):
+        """Mark sending broadcasts with no heartbeat since `before` as interrupted; returns their ids."""
+        with self.lock:
+            ids = [r[0] for r in self.db.execute(
+                "SELECT id FROM broadcasts WHERE status = 'sending' AND COALESCE(updated_at, started_at) < ?",
+                (before,))]
+            for broadcast_id in ids:
+                # Not resumed: which of its recipients were already sent to isn't recorded
+                self.db.execute("UPDATE broadcasts SET status = 'interrupted', finished_at = ?"
+                                " WHERE id = ? AND status = 'sending'", (now, broadcast_id))
+        return ids
+
+    def claim_next(self, now):
+        """Mark the next due broadcast as sending and return it; another worker can't claim it too."""
+        with self.lock:
+            while True:
+                row = self.db.execute("SELECT id, body, from_number, recipients FROM broadcasts WHERE status = 'scheduled'"
+                                      " AND send_at <= ? ORDER BY send_at LIMIT 1", (now,)).fetchone()
+                if row is None:
+                    return None
+                cur = self.db.execute("UPDATE broadcasts SET status = 'sending', started_at = ?, updated_at = ?"
+                                      " WHERE id = ? AND status = 'scheduled'", (now, now, row[0]))
+                if cur.rowcount:
+                    recipients = json.loads(row[3]) if row[3] is not None else None
+                    return {"id": row[0], "body": row[1], "from_number": row[2], "recipients": recipients}
+
+    def update(self, broadcast_id, **fields):
+        with self.lock:
+            self.db.execute(f"UPDATE broadcasts SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                            (*fields.values(), broadcast_id))
+
+    def get(self, broadcast_id):
+        with self.lock:
+            row = self.db.execute(f"SELECT {', '.join(BROADCAST_FIELDS)} FROM broadcasts WHERE id = ?",
+                                  (broadcast_id,)).fetchone()
+        return dict(zip(BROADCAST_FIELDS, row)) if row else None
+
+    def recent(self, limit=20):
+        with self.lock:
+            rows = self.db.execute(f"SELECT {', '.join(BROADCAST_FIELDS)} FROM broadcasts"
+                                   " ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(zip(BROADCAST_FIELDS, r)) for r in rows]
+
+    def counts(self):
+        with self.lock:
+            return {
+                "visitors": self.db.execute("SELECT COUNT(*) FROM visitors").fetchone()[0],
+                "opted_out": self.db.execute("SELECT COUNT(*) FROM opt_outs").fetchone()[0],
+            }
+
+    def enqueue_reply(self, sid, number, from_number, body, reply=None):
+        """Queue an async SMS reply; False if a reply for this MessageSid was already queued."""
+        with self.lock:
+            cur = self.db.execute(
+                "INSERT OR IGNORE INTO sms_replies (sid, number, from_number, body, reply, status, created_at)"
+                " VALUES (?, ?, ?, ?, ?, 'queued', ?)", (sid or None, number, from_number, body, reply, time.time()))
+        return bool(cur.rowcount)
+
+    def claim_reply(self, now, stale_before):
+        """(job, recovered): the oldest queued reply whose number has nothing earlier unfinished, now marked sending.
+
+        Replies claimed before `stale_before` and never finished are queued
+        again first; `recovered` counts them.
+        """
+        with self.lock:
+            # IMMEDIATE takes the write lock up front, so two processes can't claim the same row
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                recovered = self.db.execute("UPDATE sms_replies SET status = 'queued'"
+                                            " WHERE status = 'sending' AND claimed_at < ?", (stale_before,)).rowcount
+                row = self.db.execute(
+                    "SELECT id, sid, number, from_number, body, reply FROM sms_replies j WHERE status = 'queued'"
+                    " AND NOT EXISTS (SELECT 1 FROM sms_replies k WHERE k.number = j.number AND k.id < j.id"
+                    " AND k.status IN ('queued', 'sending')) ORDER BY id LIMIT 1").fetchone()
+                if row is not None:
+                    self.db.execute("UPDATE sms_replies SET status = 'sending', claimed_at = ? WHERE id = ?",
+                                    (now, row[0]))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None, recovered
+        return {"id": row[0], "sid": row[1], "to": row[2], "from": row[3], "body": row[4], "reply": row[5]}, recovered
+
+    def finish_reply(self, job_id, status):
+        with self.lock:
+            self.db.execute("UPDATE sms_replies SET status = ? WHERE id = ?", (status, job_id))
+
+    def reply_pending(self, number):
+        """True if a reply to `number` is still queued or being sent."""
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM sms_replies WHERE number = ? AND status IN ('queued', 'sending')"
+                                   " LIMIT 1", (number,)).fetchone() is not None
+
+    def replies_pending(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM sms_replies WHERE status IN ('queued', 'sending')").fetchone()[0]
+
+    def prune_replies(self, before):
+        """Forget finished replies (and their MessageSids) created before `before`."""
+        with self.lock:
+            self.db.execute("DELETE FROM sms_replies WHERE status IN ('sent', 'failed') AND created_at < ?", (before,))
+
+class RateLimiter:
+    """Spaces calls from any number of threads to at most `rate` per second (0: unlimited)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            at = max(self.next_at, now)
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+    def pause(self, seconds):
+        """Hold every caller back, e.g. after the provider answered 429."""
+        with self.lock:
+            self.next_at = max(self.next_at, time.monotonic() + seconds)
+
+class Broadcaster:
+    """Sends due broadcasts, one at a time per process, over a bounded sender pool.
+
+    A scheduler thread wakes every BROADCAST_SCHEDULER_SECONDS, or when
+    poked, to queue event reminders and claim due broadcasts. A running
+    broadcast records its progress every BROADCAST_HEARTBEAT_SECONDS; the
+    scheduler marks one left silent by a dead worker as interrupted. Recipients are
+    checked against the opt-out list a batch at a time just before sending,
+    so a STOP that arrives mid-broadcast is honoured. Sends are paced by a
+    shared RateLimiter and retried with backoff; a 429 pauses every sender.
+    """
+
+    def __init__(self, store, messenger, workers=BROADCAST_WORKERS, rate=BROADCAST_RATE_PER_SECOND):
+        self.store = store
+        self.messenger = messenger
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.active = None
+        self.stats = {"broadcasts": 0, "sent": 0, "failed": 0, "skipped": 0, "retries": 0, "rate_limited": 0}
+        threading.Thread(target=self._schedule_loop, name='canyon-broadcasts', daemon=True).start()
+
+    def poke(self):
+        self.wake.set()
+
+    def _schedule_loop(self):
+        while True:
+            try:
+                if EVENT_REMINDERS:
+                    self.queue_reminders(datetime.now())
+                now = time.time()
+                for broadcast_id in self.store.interrupt_stale(now, now - BROADCAST_STALE_SECONDS):
+                    log.warning("broadcast_interrupted", extra={"fields": {"id": broadcast_id}})
+                while (broadcast := self.store.claim_next(time.time())) is not None:
+                    self.run(broadcast)
+            except Exception:
+                log.exception("broadcast_scheduler_error")
+            self.wake.wait(BROADCAST_SCHEDULER_SECONDS)
+            self.wake.clear()
+
+    def queue_reminders(self, now):
+        """Schedule today's reminder for each event once it is EVENT_REMINDER_MINUTES away."""
+        if not TWILIO_FROM_NUMBER:
+            return
+        for event in EVENTS:
+            starts = datetime.combine(now.date(), datetime.strptime(event['time'], '%I:%M %p').time())
+            # A worker that boots after an event has started doesn't send a stale reminder
+            if starts - timedelta(minutes=EVENT_REMINDER_MINUTES) <= now < starts:
+                minutes = max(1, round((starts - now).total_seconds() / 60))
+                self.store.create(render_broadcast("reminder", event, minutes=minutes), TWILIO_FROM_NUMBER,
+                                  time.time(), dedupe_key=f"reminder:{now:%Y-%m-%d}:{event['name']}")
+
+    def run(self, broadcast):
+        started = time.perf_counter()
+        numbers = broadcast["recipients"] if broadcast["recipients"] is not None else self.store.audience()
+        progress = {"id": broadcast["id"], "total": len(numbers), "sent": 0, "failed": 0, "skipped": 0, "retries": 0}
+        with self.lock:
+            self.active = progress
+        jobs = queue.Queue(self.workers * 4)
+        threads = [threading.Thread(target=self._send_loop, args=(jobs, broadcast, progress), daemon=True)
+                   for _ in range(self.workers)]
+        finished = threading.Event()
+        threads.append(threading.Thread(target=self._heartbeat, args=(broadcast, progress, finished), daemon=True))
+        for t in threads:
+            t.start()
+        try:
+            for i in range(0, len(numbers), BROADCAST_BATCH_SIZE):
+                batch = numbers[i:i + BROADCAST_BATCH_SIZE]
+                opted_out = self.store.opted_out(batch)
+                for number in batch:
+                    if number in opted_out:
+                        self._count(progress, "skipped")
+                    else:
+                        jobs.put(number)
+                self.store.update(broadcast["id"], updated_at=time.time(), **self._progress(progress))
+        finally:
+            for _ in range(self.workers):
+                jobs.put(None)
+            finished.set()
+            for t in threads:
+                t.join()
+            self.store.update(broadcast["id"], status='done', finished_at=time.time(), **self._progress(progress))
+            with self.lock:
+                self.active = None
+                self.stats["broadcasts"] += 1
+            log_event("broadcast_done", sampled=False, seconds=round(time.perf_counter() - started, 2),
+                      **self._progress(progress))
+
+    def _heartbeat(self, broadcast, progress, finished):
+        while not finished.wait(BROADCAST_HEARTBEAT_SECONDS):
+            try:
+                self.store.update(broadcast["id"], updated_at=time.time(), **self._progress(progress))
+            except sqlite3.Error:
+                log.exception("broadcast_store_error")
+
+    def _send_loop(self, jobs, broadcast, progress):
+        while (number := jobs.get()) is not None:
+            self._send(number, broadcast, progress)
+
+    def _send(self, number, broadcast, progress):
+        for attempt in range(SMS_SEND_RETRIES + 1):
+            self.limiter.wait()
+            try:
+                self.messenger.send(number, broadcast["from_number"], broadcast["body"])
+                self._count(progress, "sent")
+                return
+            except SmsSendError as e:
+                if not e.retryable or attempt == SMS_SEND_RETRIES:
+                    self._count(progress, "failed")
+                    log_event("broadcast_send_failed", id=broadcast["id"], to=number, error=str(e))
+                    return
+                self._count(progress, "retries")
+                if e.status == 429:
+                    with self.lock:
+                        self.stats["rate_limited"] += 1
+                    self.limiter.pause(BROADCAST_RATE_LIMIT_PAUSE)
+                else:
+                    time.sleep(0.5 * 2 ** attempt)
+
+    def _count(self, progress, key):
+        with self.lock:
+            progress[key] += 1
+            self.stats[key] += 1
+
+    def _progress(self, progress):
+        with self.lock:
+            return {k: progress[k] for k in ("total", "sent", "failed", "skipped", "retries")}
+
+    def snapshot(self):
+        with self.lock:
+            active = dict(self.active) if self.active else {}
+            stats = dict(self.stats)
+        return dict(stats, **self.store.counts(), active_total=active.get("total", 0),
+                    active_done=sum(active.get(k, 0) for k in ("sent", "failed", "skipped")))
+
+_broadcast_store = None
+_broadcaster = None
+_broadcast_lock = threading.Lock()
+
+def get_broadcast_store():
+    global _broadcast_store
+    if _broadcast_store is None:
+        with _broadcast_lock:
+            if _broadcast_store is None:
+                _broadcast_store = BroadcastStore(BROADCAST_DB)
+    return _broadcast_store
+
+def get_broadcaster():
+    """Shared broadcaster; creating it starts the scheduler thread in this process."""
+    global _broadcaster
+    store = get_broadcast_store()
+    if _broadcaster is None:
+        with _broadcast_lock:
+            if _broadcaster is None:
+                _broadcaster = Broadcaster(store, TwilioMessagingClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN))
+    return _broadcaster
+
+def record_sms_sender(number, branch):
+    """Add an SMS sender to the broadcast audience, or opt them out if they said stop."""
+    if not number:
+        return
+    try:
+        if branch == 'stop':
+            get_broadcast_store().opt_out(number)
+        else:
+            get_broadcast_store().remember(number)
+    except sqlite3.Error:
+        log.exception("broadcast_store_error")
+
+def admin_authorized():
+    if not ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {ADMIN_TOKEN}")
+
+# --- Startup & Warm-up ---
+# After a scale-to-zero cold start the first AI reply would otherwise pay
+# for importing the SDK and opening the first TLS connection
+OPENAI_WARM_UP = os.getenv('OPENAI_WARM_UP', '1') == '1'
+
+def warm_up():
+    """Start a new worker's background work.
+
+    Event reminders and the async SMS dispatcher start if enabled, and the
+    broadcast scheduler starts if broadcasts are waiting (scheduled for
+    later, or left sending by a worker that died). A background thread
+    imports the OpenAI SDK and opens a pooled connection.
+    """
+    try:
+        if EVENT_REMINDERS or get_broadcast_store().unfinished():
+            # The broadcaster's scheduler thread queues and sends them
+            get_broadcaster()
+    except sqlite3.Error:
+        log.exception("broadcast_store_error")
+    if TWILIO_ASYNC_REPLIES:
+        # Replies queued before a restart are sent without waiting for a new message
+        get_sms_dispatcher()
+    if OPENAI_WARM_UP:
+        threading.Thread(target=_warm_up, name='canyon-warm-up', daemon=True).start()
+
+def _warm_up():
+    started = time.perf_counter()
+    try:
+        if not OPENAI_API_KEY:
+            import openai  # noqa: F401
+            return
+        client = get_openai_client()
+        with metrics.timer(PHASE_METRIC, phase='warm_up'):
+            client.beta.assistants.retrieve(ASSISTANT_ID, timeout=10.0)
     except Exception as e:
-        import traceback
-        print("[OPENAI ERROR]", e)
-        traceback.print_exc()
-        return None
+        log.warning("warm_up_failed", extra={"fields": {"error": str(e)}})
+        return
+    log_event("warm_up", sampled=False, seconds=round(time.perf_counter() - started, 3))
+
+def before_fork():
+    """Run in a preloading gunicorn master before each worker is forked.
+
+    The SDK is imported here once and shared copy-on-write with the
+    workers. fork() copies no threads, and a lock held by one would stay
+    held in the child, so the log listener is stopped first.
+    """
+    import openai  # noqa: F401
+    stop_log_listener()
+
+def after_fork():
+    """Run in each forked worker: a fresh log queue and listener, with no inherited clients, threads or database handles."""
+    global _openai_client, _openai_client_lock, _sms_dispatcher, _sms_dispatcher_lock
+    global _broadcast_store, _broadcaster, _broadcast_lock
+    start_log_listener()
+    _openai_client, _openai_client_lock = None, threading.Lock()
+    _sms_dispatcher, _sms_dispatcher_lock = None, threading.Lock()
+    _broadcast_store, _broadcaster, _broadcast_lock = None, None, threading.Lock()
 
 # --- Main Route ---
 @app.route('/sms', methods=['POST'])
 def sms_reply():
-    import sys
-    print('--- Incoming /sms request ---', file=sys.stderr)
-    print('Headers:', dict(request.headers), file=sys.stderr)
-    print('is_json:', request.is_json, file=sys.stderr)
-    print('form:', dict(request.form), file=sys.stderr)
-    print('json:', request.get_json(silent=True), file=sys.stderr)
+    started = time.perf_counter()
+    branch = 'error'
     try:
         # Accept both JSON (for web) and form data (for Twilio)
         if request.is_json:
@@ -156,45 +1915,36 @@ def sms_reply():
             visited = False
             twilio_mode = True
 
-        lower_msg = user_msg.lower() if user_msg else ''
-
-        if lower_msg in ['stop', 'leave me alone']:
-            reply = "Understood. I’ll step back. If you need me, just text again. 🌙"
-        elif any(x in lower_msg for x in ["bathroom", "restroom", "toilet"]):
-            reply = get_bathroom_info()
-        elif any(x in lower_msg for x in ["how do i get", "directions", "address", "where is canyon", "get to canyon", "find canyon", "location"]):
-            reply = (
-                "🗺️ Canyon is at 456 Postmodern Ave, New York, NY 10013.\n"
-                "Here’s a map: https://goo.gl/maps/xyzCanyon\n"
-                "Subway: Canal St (A/C/E/N/Q/R/6).\n"
-                "If you get lost, just text me—I’ll send a poetic rescue squad."
-            )
-        elif any(x in lower_msg for x in ["hello", "hi", "hey"]):
-            greeting = get_greeting(user_name)
-            if visited:
-                greeting += " (Welcome back!)"
-            reply = greeting
+        if twilio_mode and TWILIO_ASYNC_REPLIES:
+            branch, reply = local_answer(user_msg)
+            dispatcher = get_sms_dispatcher()
+            sender = request.form.get('From')
+            record_sms_sender(sender, branch)
+            # Answer instantly when we can, unless an earlier reply to this number is still queued
+            if reply is None or dispatcher.has_pending(sender):
+                dispatcher.submit(request.form.get('MessageSid'), sender, request.form.get('To'), user_msg, reply)
+                branch = 'queued'
+                return Response(EMPTY_TWIML, mimetype='application/xml')
         else:
-            ai_reply = openai_fallback(user_msg, user_name)
-            reply = ai_reply if ai_reply else "Sorry, I couldn't get a response from the AI right now."
+            branch, reply = answer_message(user_msg, user_name, visited, visitor_key(twilio_mode))
+            if twilio_mode:
+                record_sms_sender(request.form.get('From'), branch)
 
-        print('Reply:', reply, file=sys.stderr)
         if twilio_mode:
             # Respond in TwiML XML for Twilio
-            from flask import Response
-            twiml = f"""<?xml version='1.0' encoding='UTF-8'?><Response><Message>{reply}</Message></Response>"""
+            # Replies can contain &, < and > ("Artist Q&A"), which would break the XML
+            twiml = f"""<?xml version='1.0' encoding='UTF-8'?><Response><Message>{xml_escape(reply)}</Message></Response>"""
             return Response(twiml, mimetype='application/xml')
         else:
             return jsonify({"reply": reply})
-    except Exception as e:
-        import traceback
-        print('Exception in /sms:', e, file=sys.stderr)
-        traceback.print_exc()
+    except Exception:
+        log.exception("sms_error", extra={"fields": {"form": dict(request.form), "json": request.get_json(silent=True)}})
         if 'twilio_mode' in locals() and twilio_mode:
-            from flask import Response
             return Response("<Response><Message>Sorry, an error occurred.</Message></Response>", mimetype='application/xml')
         else:
             return jsonify({'reply': 'Sorry, an error occurred.'}), 500
+    finally:
+        observe_reply('sms', branch, started, twilio=request.mimetype != 'application/json')
 
 @app.route('/')
 def index():
@@ -204,6 +1954,80 @@ def index():
 def test():
     return "Test route is working!"
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    lines = metrics.render()
+    lines += render_gauges('canyon_reply_cache', reply_cache.snapshot())
+    lines += render_gauges('canyon_visitor_threads', visitor_threads.snapshot())
+    lines += render_gauges('canyon_admission', admission.snapshot())
+    if _sms_dispatcher is not None:
+        lines += render_gauges('canyon_sms_dispatch', _sms_dispatcher.snapshot())
+    if _broadcaster is not None:
+        lines += render_gauges('canyon_broadcast', _broadcaster.snapshot())
+    lines.append(f"canyon_log_dropped {DroppingQueueHandler.dropped}")
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(reply_cache.snapshot())
+
+@app.route('/admin/broadcasts', methods=['POST'])
+def create_broadcast():
+    """Schedule an SMS broadcast to every opted-in visitor, or to the numbers in "to".
+
+    JSON body: "template" (a BROADCAST_TEMPLATES name or a literal with
+    {fields}, default "reminder"), "event" (an EVENTS name whose fields fill
+    the template), "minutes", "send_at" (local ISO time, default now),
+    "to" and "from". The message is rendered once, here, for every recipient.
+    """
+    if not admin_authorized():
+        return jsonify({'error': 'unauthorized'}), 401
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'body must be a JSON object'}), 400
+    event = None
+    if data.get('event'):
+        event = next((e for e in EVENTS if e['name'].lower() == str(data['event']).lower()), None)
+        if event is None:
+            return jsonify({'error': f"unknown event {data['event']!r}"}), 400
+    template = data.get('template', 'reminder')
+    if not isinstance(template, str):
+        return jsonify({'error': '"template" must be a string'}), 400
+    try:
+        body = render_broadcast(template, event,
+                                minutes=data.get('minutes', EVENT_REMINDER_MINUTES))
+    except (KeyError, IndexError, ValueError) as e:
+        return jsonify({'error': f"template needs {e}"}), 400
+    from_number = data.get('from') or TWILIO_FROM_NUMBER
+    if not from_number:
+        return jsonify({'error': 'no sending number: set TWILIO_FROM_NUMBER or pass "from"'}), 400
+    recipients = data.get('to')
+    if recipients is not None and not (isinstance(recipients, list) and all(isinstance(n, str) for n in recipients)):
+        return jsonify({'error': '"to" must be a list of phone numbers'}), 400
+    try:
+        send_at = datetime.fromisoformat(data['send_at']).timestamp() if data.get('send_at') else time.time()
+    except (TypeError, ValueError):
+        return jsonify({'error': '"send_at" must be an ISO date and time'}), 400
+    broadcaster = get_broadcaster()
+    broadcast_id = broadcaster.store.create(body, from_number, send_at, recipients)
+    broadcaster.poke()
+    return jsonify(broadcaster.store.get(broadcast_id)), 202
+
+@app.route('/admin/broadcasts', methods=['GET'])
+def list_broadcasts():
+    if not admin_authorized():
+        return jsonify({'error': 'unauthorized'}), 401
+    return jsonify(get_broadcast_store().recent())
+
+@app.route('/admin/broadcasts/<broadcast_id>', methods=['GET'])
+def broadcast_status(broadcast_id):
+    if not admin_authorized():
+        return jsonify({'error': 'unauthorized'}), 401
+    broadcast = get_broadcast_store().get(broadcast_id)
+    if broadcast is None:
+        return jsonify({'error': 'not found'}), 404
+    return jsonify(broadcast)
+
 @app.route('/reset_session', methods=['POST'])
 def reset_session():
     session.clear()
@@ -211,19 +2035,65 @@ def reset_session():
 
 @app.route('/webchat', methods=['POST'])
 def webchat():
+    started = time.perf_counter()
+    branch, reply = webchat_answer()
+    observe_reply('webchat', branch, started)
+    return jsonify({"reply": reply})
+
+@app.route('/webchat/stream', methods=['POST'])
+def webchat_stream():
+    """Same conversation as /webchat, sent as Server-Sent Events.
+
+    Each `data:` event carries {"text": ...} to append to the reply; an
+    `event: done` closes the stream. Local answers arrive as a single event.
+    A reply that breaks off part way sends `event: truncated` before done.
+    """
+    started = time.perf_counter()
+    branch, reply = webchat_answer(ai=False)
+    request_msg = request.json.get('Body', '').strip()
+    pieces = [reply] if reply is not None else openai_fallback_stream(
+        request_msg, session.get('user_name'), visitor_key())
+
+    def events():
+        nonlocal branch
+        sent = False
+        try:
+            try:
+                for piece in pieces:
+                    sent = True
+                    yield f"data: {json.dumps({'text': piece})}\n\n"
+            except LoadShed:
+                # Only raised before any text: the reply couldn't start within the budget
+                branch, sent = 'degraded', True
+                yield f"data: {json.dumps({'text': degraded_reply(request_msg)})}\n\n"
+            except AssistantRunError:
+                branch = 'truncated'
+                yield "event: truncated\ndata: {}\n\n"
+            if not sent:
+                yield f"data: {json.dumps({'text': AI_UNAVAILABLE_REPLY})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        finally:
+            observe_reply('webchat_stream', branch, started)
+
+    # X-Accel-Buffering stops nginx-style proxies from holding the stream back
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Words that can follow "I'm" or answer "what should I call you?" without being a name
+NON_NAMES = {"in", "at", "here", "there", "gallery", "the", "a", "an", "museum", "visitor", "i", "me", "you", "we", "us", "on", "to", "for", "and", "but", "or", "with", "from", "of", "is", "am", "are", "my", "your", "call", "it", "this", "that", "yes", "no", "thanks", "thank", "hi", "hello", "hey"}
+NAME_PATTERN = re.compile(r"(?:my name is|i'm|i am|call me)\s+([a-zA-Z][a-zA-Z\-']{1,19})(?:\s+([a-zA-Z][a-zA-Z\-']{1,19}))?", re.IGNORECASE)
+
+def webchat_answer(ai=True):
+    """(branch, reply) for a webchat message; with ai=False the reply is None where the AI would answer."""
     # Use Flask session to remember user's name
     user_msg = request.json.get('Body', '').strip()
     visited = request.json.get('Visited', False)
     user_name = session.get('user_name', None)
-    lower_msg = user_msg.lower()
+    lower_msg = normalize_message(user_msg)
 
     # Only run name extraction if user_name is not already set
     if not user_name:
-        import re
-        NON_NAMES = {"in", "at", "here", "there", "gallery", "the", "a", "an", "museum", "visitor", "i", "me", "you", "we", "us", "on", "to", "for", "and", "but", "or", "with", "from", "of", "is", "am", "are", "my", "your", "call", "it", "this", "that", "yes", "no", "thanks", "thank", "hi", "hello", "hey"}
-
-        name_pattern = re.compile(r"(?:my name is|i'm|i am|call me)\s+([a-zA-Z][a-zA-Z\-']{1,19})(?:\s+([a-zA-Z][a-zA-Z\-']{1,19}))?", re.IGNORECASE)
-        match = name_pattern.search(user_msg)
+        match = NAME_PATTERN.search(user_msg)
         plausible_name = None
         if match:
             first = match.group(1)
@@ -241,41 +2111,43 @@ def webchat():
                 session['user_name'] = plausible_name
                 user_name = plausible_name
                 session.pop('asked_name', None)
-                return jsonify({"reply": f"Nice to meet you, {user_name}! How can I help?"})
+                return 'name', f"Nice to meet you, {user_name}! How can I help?"
             else:
                 # Don't set user_name or clear asked_name if invalid
-                return jsonify({"reply": "Sorry, I didn't catch your name. What should I call you?"})
+                return 'name', "Sorry, I didn't catch your name. What should I call you?"
         # If no name, ask for it
         session['asked_name'] = True
-        return jsonify({"reply": "Hi! What should I call you? 😊"})
+        return 'ask_name', "Hi! What should I call you? 😊"
 
     # Only respond with greeting for explicit greeting messages
-    if lower_msg.strip() in ["hello", "hi", "hey"]:
+    if lower_msg in GREETING_KEYWORDS:
         greeting = get_greeting(user_name)
         if visited:
             greeting += " (Welcome back!)"
-        return jsonify({"reply": greeting})
+        return 'greeting', greeting
 
     # All other messages go to the AI or bathroom info
     if lower_msg in ['stop', 'leave me alone']:
-        return jsonify({"reply": "Understood. I’ll step back. If you need me, just text again. 🌙"})
-    if any(x in lower_msg for x in ["bathroom", "restroom", "toilet"]):
-        return jsonify({"reply": get_bathroom_info()})
-    ai_reply = openai_fallback(user_msg, user_name)
-    if ai_reply:
-        return jsonify({"reply": ai_reply})
+        return 'stop', STOP_REPLY
+    # Greetings inside longer messages still go to the AI in webchat
+    intent = get_intent_router().match(lower_msg)
+    if intent is not None and intent['name'] != 'greeting':
+        return intent_branch(intent), local_reply(intent, user_name, visited)
+    if not ai:
+        return 'ai_fallback', None
+    try:
+        ai_reply = openai_fallback(user_msg, user_name, visitor_key())
+    except LoadShed:
+        return 'degraded', degraded_reply(user_msg)
     # No fallback: always return OpenAI Assistant response or a minimal error
-    return jsonify({"reply": "Sorry, I couldn't get a response from the AI right now."})
-
-import traceback
+    return 'ai_fallback', ai_reply or AI_UNAVAILABLE_REPLY
 
 @app.errorhandler(Exception)
 def handle_exception(e):
-    print('[GLOBAL ERROR]', e)
-    traceback.print_exc()
+    log.exception("unhandled_error", extra={"fields": {"path": request.path}})
     return jsonify({'reply': 'Sorry, something went wrong on my end. The bot is having an existential moment. 🌀'}), 500
 
 if __name__ == '__main__':
-    import os
+    warm_up()
     port = int(os.environ.get("PORT", 10000))
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,113 @@
+"""Local-answer latency during an AI burst, with and without admission control.
+
+Runs one gthread gunicorn worker against the Assistants stub. A crowd of
+senders fires open questions at /sms while a probe keeps asking where the
+bathroom is. Without a cap the AI requests take every worker thread and
+the probe waits behind them; with AI_MAX_CONCURRENT_RUNS / AI_MAX_QUEUED
+below the thread count the probe stays fast and the overflow gets a
+degraded local reply instead.
+
+    python benchmarks/admission_bench.py --threads 16 --senders 48 --duration 10
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from load_bench import AI_UNAVAILABLE, DEGRADED_MARKER, free_port, percentile, start_gunicorn
+from stub_assistants import start_stub
+
+
+def post(base, body, sender, timeout):
+    data = json.dumps({"Body": body, "From": sender}).encode()
+    req = urllib.request.Request(base + "/sms", data=data, headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            reply = json.loads(resp.read())["reply"]
+    except (urllib.error.URLError, OSError, ValueError):
+        reply = None
+    return time.perf_counter() - started, reply
+
+
+def burst(base, senders, duration, timeout):
+    probe, ai = [], []
+    stop_at = time.monotonic() + duration
+
+    def sender_loop(i):
+        n = 0
+        while time.monotonic() < stop_at:
+            ai.append(post(base, f"what would you recommend for visitor {i}, question {n}?", f"+1555{i:07d}", timeout))
+            n += 1
+
+    def probe_loop():
+        while time.monotonic() < stop_at:
+            probe.append(post(base, "where is the bathroom?", "+15550000000", timeout)[0])
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=sender_loop, args=(i,)) for i in range(senders)]
+    threads.append(threading.Thread(target=probe_loop))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return probe, ai
+
+
+def admission_gauges(base):
+    text = urllib.request.urlopen(base + "/metrics", timeout=5).read().decode()
+    return {line.split()[0].replace("canyon_admission_", ""): float(line.split()[1])
+            for line in text.splitlines() if line.startswith("canyon_admission_")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16, help="gthread threads in the worker")
+    parser.add_argument("--senders", type=int, default=48, help="concurrent senders asking the AI")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--run-seconds", type=float, default=2.0)
+    parser.add_argument("--budget", type=float, default=4.0, help="AI_LATENCY_BUDGET_SECONDS")
+    parser.add_argument("--timeout", type=float, default=35)
+    args = parser.parse_args()
+
+    stub, _, openai_base = start_stub(run_seconds=args.run_seconds, api_latency=0.02)
+    base_env = dict(os.environ, OPENAI_API_KEY="stub", OPENAI_BASE_URL=openai_base, LOG_SAMPLE_RATE="0",
+                    REPLY_CACHE_MAX_ENTRIES="0", AI_SENDER_RATE_PER_MINUTE="0",
+                    AI_LATENCY_BUDGET_SECONDS=str(args.budget))
+    modes = {
+        "uncapped": {"AI_MAX_CONCURRENT_RUNS": "100000", "AI_MAX_QUEUED": "100000",
+                     "AI_LATENCY_BUDGET_SECONDS": str(args.timeout)},
+        "admission": {"AI_MAX_CONCURRENT_RUNS": str(max(1, args.threads // 2)),
+                      "AI_MAX_QUEUED": str(max(1, args.threads // 4))},
+    }
+    print(f"threads={args.threads} senders={args.senders} run={args.run_seconds}s budget={args.budget}s")
+    print(f"{'mode':<10} {'probe p50 ms':>12} {'probe p99 ms':>12} {'ai p95 s':>9} {'ai ok':>6} "
+          f"{'degraded':>9} {'failed':>7} {'shed':>6}")
+    for mode, overrides in modes.items():
+        port = free_port()
+        proc = start_gunicorn("gthread", 1, args.threads, port, dict(base_env, **overrides))
+        base = f"http://127.0.0.1:{port}"
+        try:
+            probe, ai = burst(base, args.senders, args.duration, args.timeout)
+            gauges = admission_gauges(base)
+        finally:
+            proc.terminate()
+            proc.wait(10)
+        degraded = sum(1 for _, r in ai if r and DEGRADED_MARKER in r)
+        failed = sum(1 for _, r in ai if r is None or AI_UNAVAILABLE in r)
+        print(f"{mode:<10} {statistics.median(probe) * 1000:>12.1f} {percentile(probe, 99) * 1000:>12.1f} "
+              f"{percentile([s for s, _ in ai], 95):>9.2f} {len(ai) - degraded - failed:>6} {degraded:>9} "
+              f"{failed:>7} {int(gauges.get('shed', 0)):>6}")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
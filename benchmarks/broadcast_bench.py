@@ -0,0 +1,99 @@
+"""Broadcast throughput to a large audience through the fake SMS sink.
+
+Fills a throwaway broadcast database with --audience numbers (a share of
+them opted out) and sends one event reminder to all of them through the
+Broadcaster, the same path /admin/broadcasts uses. Each sender pool size
+runs twice. "per-message" opens a new connection for every message, as
+the original urllib client did. "keep-alive" is the current
+TwilioMessagingClient. --connect-latency charges each new connection for the
+TLS handshake, and --sink-rate-limit makes the sink answer 429 like a
+real sending number does.
+
+    python benchmarks/broadcast_bench.py --audience 10000 --workers 8 32 --sink-latency 0.05
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fake_sms_sink import start_sink
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--audience", type=int, default=10000)
+    parser.add_argument("--opted-out", type=float, default=0.02, help="share of the audience that said stop")
+    parser.add_argument("--workers", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--rate", type=float, default=0, help="BROADCAST_RATE_PER_SECOND (0: unlimited)")
+    parser.add_argument("--sink-latency", type=float, default=0.05)
+    parser.add_argument("--sink-rate-limit", type=int, default=None, help="sink answers 429 above this many/s")
+    parser.add_argument("--connect-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    sink, sink_state, api_base = start_sink(latency=args.sink_latency, rate_limit=args.sink_rate_limit,
+                                            connect_latency=args.connect_latency)
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.update(LOG_SAMPLE_RATE="0", BROADCAST_DB=os.path.join(tmp.name, "bench.db"),
+                      TWILIO_API_BASE=api_base, TWILIO_ACCOUNT_SID="AC0", TWILIO_AUTH_TOKEN="x",
+                      TWILIO_FROM_NUMBER="+15550000000")
+    import app
+
+    class PerMessageClient(app.TwilioMessagingClient):
+        """The original client: urllib, so a new connection for every message."""
+
+        def send(self, to, from_, body):
+            data = urllib.parse.urlencode({"To": to, "From": from_, "Body": body}).encode()
+            req = urllib.request.Request(f"{api_base}{self.path}", data=data, headers=self.headers, method="POST")
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                    return json.loads(resp.read() or b"{}").get("sid")
+            except urllib.error.HTTPError as e:
+                raise app.SmsSendError(f"Twilio returned {e.code}", retryable=e.code == 429 or e.code >= 500,
+                                       status=e.code)
+            except (urllib.error.URLError, OSError) as e:
+                raise app.SmsSendError(str(e))
+
+    numbers = [f"+1555{i:07d}" for i in range(args.audience)]
+    store = app.get_broadcast_store()
+    store.add_visitors(numbers)
+    for number in random.Random(3).sample(numbers, int(args.audience * args.opted_out)):
+        store.opt_out(number)
+    broadcaster = app.get_broadcaster()
+    body = app.render_broadcast("reminder", app.EVENTS[1], minutes=15)
+
+    print(f"audience={args.audience} opted_out={store.counts()['opted_out']} sink_latency={args.sink_latency}s "
+          f"connect={args.connect_latency}s rate={args.rate or 'unlimited'} sink_limit={args.sink_rate_limit or 'none'}")
+    print(f"{'client':<12} {'workers':>7} {'sent':>7} {'sends/s':>8} {'seconds':>8} {'retries':>8} {'429s':>6} "
+          f"{'conns':>6}")
+    for workers in args.workers:
+        for name, client in (("per-message", PerMessageClient("AC0", "x", api_base)),
+                             ("keep-alive", app.TwilioMessagingClient("AC0", "x", api_base))):
+            broadcaster.messenger = client
+            broadcaster.workers = workers
+            broadcaster.limiter = app.RateLimiter(args.rate)
+            limited_before = broadcaster.stats["rate_limited"]
+            conns_before = sink_state.connections
+            broadcast_id = store.create(body, "+15550000000", time.time())
+            broadcaster.poke()
+            while (result := store.get(broadcast_id))["status"] != "done":
+                time.sleep(0.1)
+            seconds = result["finished_at"] - result["started_at"]
+            print(f"{name:<12} {workers:>7} {result['sent']:>7} {result['sent'] / seconds:>8.1f} {seconds:>8.2f} "
+                  f"{result['retries']:>8} {broadcaster.stats['rate_limited'] - limited_before:>6} "
+                  f"{sink_state.connections - conns_before:>6}")
+    sink.shutdown()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
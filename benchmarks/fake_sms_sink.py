@@ -0,0 +1,125 @@
+"""A local stand-in for Twilio's Create Message endpoint.
+
+Accepts POST /2010-04-01/Accounts/<sid>/Messages.json, records every
+message, and can add latency (per message and per new connection), fail
+a share of sends with a 503, or answer 429 above a messages-per-second
+limit.
+
+    python benchmarks/fake_sms_sink.py --port 8098
+    TWILIO_API_BASE=http://127.0.0.1:8098 TWILIO_ACCOUNT_SID=AC1 TWILIO_AUTH_TOKEN=x python app.py
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SinkState:
+    def __init__(self, latency=0.05, failure_rate=0.0, rate_limit=None, connect_latency=0.0):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.rejected = 0
+        self.connections = 0
+        self.window = (0, 0)  # (second, sends in that second)
+
+    def over_limit(self):
+        if not self.rate_limit:
+            return False
+        second = int(time.monotonic())
+        with self.lock:
+            start, count = self.window
+            count = count + 1 if start == second else 1
+            self.window = (second, count)
+            return count > self.rate_limit
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; don't hold the body for an ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            # Stands in for the TCP + TLS handshake a fresh connection to Twilio pays
+            time.sleep(state.connect_latency)
+            with state.lock:
+                state.connections += 1
+
+        def _json(self, body, status):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            form = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode()))
+            if not re.fullmatch(r"/2010-04-01/Accounts/[^/]+/Messages\.json", self.path):
+                return self._json({"message": "not found"}, 404)
+            time.sleep(state.latency)
+            if state.over_limit():
+                with state.lock:
+                    state.rejected += 1
+                return self._json({"code": 20429, "message": "Too Many Requests"}, 429)
+            if random.random() < state.failure_rate:
+                with state.lock:
+                    state.rejected += 1
+                return self._json({"message": "Service Unavailable"}, 503)
+            with state.lock:
+                sid = f"SM{next(state.ids):032d}"
+                state.messages.append({"sid": sid, "to": form.get("To"), "from": form.get("From"),
+                                       "body": form.get("Body"), "at": time.perf_counter()})
+            self._json({"sid": sid, "status": "queued"}, 201)
+
+    return Handler
+
+
+class SinkServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Broadcasts open dozens of connections at once
+    request_queue_size = 256
+
+
+def start_sink(port=0, **config):
+    """Serve the sink on a background thread; returns (server, state, api_base)."""
+    state = SinkState(**config)
+    server = SinkServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=None, help="messages per second before 429s")
+    parser.add_argument("--connect-latency", type=float, default=0.0)
+    args = parser.parse_args()
+    server, _, api_base = start_sink(args.port, latency=args.latency, failure_rate=args.failure_rate,
+                                     rate_limit=args.rate_limit, connect_latency=args.connect_latency)
+    print(f"Fake SMS sink on {api_base}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
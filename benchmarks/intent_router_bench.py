@@ -0,0 +1,60 @@
+"""How intent matching cost grows with the number of keywords.
+
+Compares the compiled IntentRouter against the old chain of
+`any(x in lower_msg for x in [...])` scans over the same keyword set.
+
+    python benchmarks/intent_router_bench.py
+"""
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import IntentRouter, build_intents, load_custom_knowledge, normalize_message
+
+MESSAGES = [
+    "where is the bathroom?",
+    "what are your opening hours",
+    "how much is admission",
+    "is there food",
+    "how do i get to canyon from soho",
+    "tell me something surprising about glitch art",
+]
+
+
+def synthetic_intents(n_keywords, per_intent=10):
+    rng = random.Random(n_keywords)
+    intents = build_intents(load_custom_knowledge() or [])
+    extra = n_keywords - sum(len(i['keywords']) for i in intents)
+    for start in range(0, max(extra, 0), per_intent):
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 12)))
+                 for _ in range(min(per_intent, extra - start))]
+        intents.insert(-1, {"name": f"synthetic:{start}", "keywords": words, "reply": "ok"})
+    return intents
+
+
+def naive_match(intents, lower_msg):
+    for intent in intents:
+        if any(x in lower_msg for x in intent['keywords']):
+            return intent
+    return None
+
+
+def main():
+    messages = [normalize_message(m) for m in MESSAGES]
+    print(f"{'keywords':>9} {'router us/msg':>14} {'any() us/msg':>13}")
+    for n in (50, 100, 500, 1000, 5000, 10000):
+        intents = synthetic_intents(n)
+        router = IntentRouter(intents)
+        runs = max(20, 200000 // n)
+        t_router = timeit.timeit(lambda: [router.match(m) for m in messages], number=runs)
+        t_naive = timeit.timeit(lambda: [naive_match(intents, m) for m in messages], number=runs)
+        per = runs * len(messages) / 1e6
+        print(f"{len(router.index):>9} {t_router / per:>14.2f} {t_naive / per:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
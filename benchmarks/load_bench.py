@@ -0,0 +1,316 @@
+"""Replay a message mix against /sms and /webchat under gunicorn and record latency.
+
+Starts the local Assistants stub, then for each worker configuration
+launches `gunicorn app:app` pointed at it and drives it with concurrent
+virtual visitors. Each visitor has its own cookie jar, so /webchat
+sessions (name capture, per-visitor threads) behave like real browsers.
+Throughput, p50/p95/p99 latency, error rate and degraded rate (the share
+of requests shed by admission control and answered with a quick local
+stand-in) are reported per route and written to a JSON file; --compare
+flags regressions against an earlier file. For /webchat/stream the time to the first streamed piece of the
+reply (TTFT) is reported as well.
+
+    python benchmarks/load_bench.py --matrix sync:1 gthread:1 gthread:2 --duration 20
+    python benchmarks/load_bench.py --replay traffic.jsonl --compare benchmarks/results/baseline.json
+
+A replay file has one message per line:
+    {"route": "sms" | "sms_twilio" | "webchat" | "webchat_stream", "Body": "where is the bathroom?"}
+"""
+import argparse
+import http.cookiejar
+import itertools
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from fake_sms_sink import start_sink
+from stub_assistants import start_stub
+
+AI_UNAVAILABLE = "Sorry, I couldn't get a response from the AI right now."
+# Every degraded_reply() says this
+DEGRADED_MARKER = "juggling a lot of questions"
+
+# Roughly what the floor sees: mostly logistics, a steady share of open questions
+SYNTHETIC_MIX = [
+    (20, "where is the bathroom?"),
+    (12, "what are your opening hours"),
+    (10, "how much is admission"),
+    (8, "is there food"),
+    (6, "how do i get to canyon"),
+    (5, "hi"),
+    (4, "tell me about Neon Aftermath"),
+    (10, "what's on today?"),
+    (8, "which exhibition is best for kids?"),
+    (7, "can you recommend something quiet to see?"),
+    (5, "what should I see if I only have 20 minutes?"),
+    (5, "is the Live Coding Demo good for beginners?"),
+]
+ROUTE_WEIGHTS = [("sms", 3), ("sms_twilio", 4), ("webchat", 2), ("webchat_stream", 2)]
+
+
+def synthetic_messages(n, seed=7):
+    rng = random.Random(seed)
+    bodies = [b for w, b in SYNTHETIC_MIX for _ in range(w)]
+    routes = [r for r, w in ROUTE_WEIGHTS for _ in range(w)]
+    return [{"route": rng.choice(routes), "Body": rng.choice(bodies)} for _ in range(n)]
+
+
+def load_replay(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(worker_class, workers, threads, port, env):
+    # gunicorn quietly turns "sync" into "gthread" when threads > 1
+    threads = threads if worker_class == "gthread" else 1
+    cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app",
+           "--bind", f"127.0.0.1:{port}", "--worker-class", worker_class, "--workers", str(workers),
+           "--threads", str(threads), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=os.path.dirname(HERE), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/test", timeout=1).read()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with {proc.returncode}: {' '.join(cmd)}")
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("gunicorn did not start within 30s")
+
+
+class Visitor:
+    """One simulated person: a cookie jar for webchat and a phone number for SMS."""
+
+    def __init__(self, base, number):
+        self.base = base
+        self.number = number
+        self.sids = itertools.count()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.named = False
+
+    def send(self, route, body, timeout):
+        """POST one message; returns ("ok" | "degraded" | "error", seconds to the first streamed piece or None)."""
+        if route.startswith("webchat") and not self.named:
+            # First webchat message in a session is the name prompt
+            self._post("/webchat", json.dumps({"Body": f"my name is Guest {self.number[-4:]}"}).encode(),
+                       "application/json", timeout)
+            self.named = True
+        if route == "sms_twilio":
+            data = urllib.parse.urlencode({"Body": body, "From": self.number, "To": "+15550000000",
+                                           "MessageSid": f"SM{self.number}{next(self.sids)}"}).encode()
+            return self._post("/sms", data, "application/x-www-form-urlencoded", timeout), None
+        data = json.dumps({"Body": body}).encode()
+        if route == "webchat_stream":
+            return self._stream("/webchat/stream", data, timeout)
+        path = "/webchat" if route == "webchat" else "/sms"
+        return self._post(path, data, "application/json", timeout), None
+
+    def _post(self, path, data, content_type, timeout):
+        req = urllib.request.Request(self.base + path, data=data, headers={"Content-Type": content_type})
+        try:
+            with self.opener.open(req, timeout=timeout) as resp:
+                return outcome(resp.status, resp.read().decode())
+        except (urllib.error.URLError, OSError):
+            return "error"
+
+    def _stream(self, path, data, timeout):
+        req = urllib.request.Request(self.base + path, data=data, headers={"Content-Type": "application/json"})
+        started = time.perf_counter()
+        ttft = None
+        text = []
+        try:
+            with self.opener.open(req, timeout=timeout) as resp:
+                for line in resp:
+                    if line.startswith(b"data: ") and line.strip() != b"data: {}":
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        text.append(json.loads(line[6:])["text"])
+                    elif line.startswith(b"event: truncated"):
+                        return "error", ttft
+                    elif line.startswith(b"event: done"):
+                        return outcome(resp.status, "".join(text)), ttft
+        except (urllib.error.URLError, OSError):
+            pass
+        return "error", ttft
+
+
+def outcome(status, text):
+    if status != 200 or AI_UNAVAILABLE in text:
+        return "error"
+    return "degraded" if DEGRADED_MARKER in text else "ok"
+
+
+def drive(base, messages, concurrency, duration, timeout):
+    samples = []  # (route, seconds, outcome, ttft)
+    lock = threading.Lock()
+    cursor = itertools.count()
+    stop_at = time.monotonic() + duration
+
+    def visitor_loop(i):
+        visitor = Visitor(base, f"+1555{i:07d}")
+        while time.monotonic() < stop_at:
+            msg = messages[next(cursor) % len(messages)]
+            started = time.perf_counter()
+            result, ttft = visitor.send(msg["route"], msg["Body"], timeout)
+            with lock:
+                samples.append((msg["route"], time.perf_counter() - started, result, ttft))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=visitor_loop, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, time.perf_counter() - started
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples, elapsed):
+    def stats(rows):
+        latencies = [r[1] for r in rows]
+        result = {
+            "requests": len(rows),
+            "throughput": round(len(rows) / elapsed, 2),
+            "p50_ms": round(statistics.median(latencies) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "error_rate": round(sum(1 for r in rows if r[2] == "error") / len(rows), 4),
+            "degraded_rate": round(sum(1 for r in rows if r[2] == "degraded") / len(rows), 4),
+        }
+        ttfts = [r[3] for r in rows if r[3] is not None]
+        if ttfts:
+            result["ttft_p50_ms"] = round(statistics.median(ttfts) * 1000, 1)
+            result["ttft_p95_ms"] = round(percentile(ttfts, 95) * 1000, 1)
+        return result
+    result = {"all": stats(samples)} if samples else {}
+    for route in sorted({r[0] for r in samples}):
+        result[route] = stats([r for r in samples if r[0] == route])
+    return result
+
+
+def compare(current, baseline_path, tolerance):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["worker_class"], r["workers"]): r for r in json.load(f)["runs"]}
+    regressions = []
+    for run in current["runs"]:
+        base = baseline.get((run["worker_class"], run["workers"]))
+        if not base:
+            continue
+        for route, now in run["routes"].items():
+            before = base["routes"].get(route)
+            if not before:
+                continue
+            checks = [("p95_ms", now["p95_ms"] > before["p95_ms"] * (1 + tolerance)),
+                      ("throughput", now["throughput"] < before["throughput"] * (1 - tolerance)),
+                      ("error_rate", now["error_rate"] > before["error_rate"] + 0.01)]
+            if "degraded_rate" in before:
+                checks.append(("degraded_rate", now["degraded_rate"] > before["degraded_rate"] + 0.01))
+            if "ttft_p95_ms" in now and "ttft_p95_ms" in before:
+                checks.append(("ttft_p95_ms", now["ttft_p95_ms"] > before["ttft_p95_ms"] * (1 + tolerance)))
+            for key, worse in checks:
+                if worse:
+                    regressions.append(f"{run['worker_class']}:{run['workers']} {route} {key}: "
+                                       f"{before[key]} -> {now[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--matrix", nargs="+", default=["sync:1", "gthread:1", "gthread:2"],
+                        help="worker_class:workers pairs")
+    parser.add_argument("--threads", type=int, default=32, help="threads per gthread worker")
+    parser.add_argument("--concurrency", type=int, default=32, help="simultaneous visitors")
+    parser.add_argument("--duration", type=float, default=15, help="seconds per configuration")
+    parser.add_argument("--timeout", type=float, default=35)
+    parser.add_argument("--replay", help="JSONL message mix (default: synthetic)")
+    parser.add_argument("--run-seconds", type=float, default=1.5)
+    parser.add_argument("--api-latency", type=float, default=0.03)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--twilio-async", action="store_true", help="run with TWILIO_ASYNC_REPLIES=1")
+    parser.add_argument("--sender-rate", type=float, default=0,
+                        help="AI_SENDER_RATE_PER_MINUTE for the app (0: no per-sender limit)")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    messages = load_replay(args.replay) if args.replay else synthetic_messages(2000)
+    stub, _, openai_base = start_stub(run_seconds=args.run_seconds, api_latency=args.api_latency,
+                                      failure_rate=args.failure_rate)
+    sink, _, twilio_base = start_sink(latency=0.02)
+    env = dict(os.environ, OPENAI_API_KEY="stub", OPENAI_BASE_URL=openai_base, LOG_SAMPLE_RATE="0",
+               TWILIO_API_BASE=twilio_base, TWILIO_ACCOUNT_SID="AC0", TWILIO_AUTH_TOKEN="x",
+               TWILIO_ASYNC_REPLIES="1" if args.twilio_async else "0",
+               AI_SENDER_RATE_PER_MINUTE=str(args.sender_rate))
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "messages": len(messages),
+        "runs": [],
+    }
+    print(f"{'workers':<12} {'route':<15} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} "
+          f"{'degraded':>9} {'ttft p50':>9} {'ttft p95':>9}")
+    for spec in args.matrix:
+        worker_class, workers = spec.split(":")
+        port = free_port()
+        proc = start_gunicorn(worker_class, int(workers), args.threads, port, env)
+        try:
+            samples, elapsed = drive(f"http://127.0.0.1:{port}", messages, args.concurrency,
+                                     args.duration, args.timeout)
+        finally:
+            proc.terminate()
+            proc.wait(10)
+        routes = summarize(samples, elapsed)
+        report["runs"].append({"worker_class": worker_class, "workers": int(workers),
+                               "threads": args.threads if worker_class == "gthread" else 1, "routes": routes})
+        for route, s in routes.items():
+            print(f"{spec:<12} {route:<15} {s['throughput']:>7.2f} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} "
+                  f"{s['p99_ms']:>8.1f} {s['error_rate']:>7.2%} {s['degraded_rate']:>9.2%} {s.get('ttft_p50_ms', '-'):>9} "
+                  f"{s.get('ttft_p95_ms', '-'):>9}")
+    stub.shutdown()
+    sink.shutdown()
+
+    output = args.output or os.path.join(HERE, "results", f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        regressions = compare(report, args.compare, args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.compare)
+
+
+if __name__ == "__main__":
+    main()
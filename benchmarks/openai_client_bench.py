@@ -0,0 +1,79 @@
+"""Round trips, new connections and latency per AI reply: per-call clients vs the pooled path.
+
+"per-call" is the old openai_fallback: a fresh OpenAI client, a new
+thread, then the message, for every reply. "pooled" is _openai_reply
+with the shared client and each visitor's thread kept between messages.
+Both talk to the local Assistants stub, which charges --connect-latency
+for each new connection as a stand-in for the TLS handshake.
+
+    python benchmarks/openai_client_bench.py --visitors 10 --messages 5 [--poll]
+
+Some SDK releases close the connection after every streamed run instead
+of draining it, so connection reuse is clearest with --poll.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import warnings
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openai
+
+from stub_assistants import start_stub
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--visitors", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=5, help="messages per visitor")
+    parser.add_argument("--run-seconds", type=float, default=0.2)
+    parser.add_argument("--api-latency", type=float, default=0.03)
+    parser.add_argument("--connect-latency", type=float, default=0.1)
+    parser.add_argument("--poll", action="store_true", help="poll runs instead of streaming them")
+    args = parser.parse_args()
+
+    server, state, base_url = start_stub(run_seconds=args.run_seconds, api_latency=args.api_latency,
+                                         connect_latency=args.connect_latency)
+    os.environ.update(OPENAI_API_KEY="stub", OPENAI_BASE_URL=base_url, AI_SENDER_RATE_PER_MINUTE="0")
+    import app
+    app.RUN_STREAMING = not args.poll
+
+    def per_call(visitor, msg):
+        client = openai.OpenAI(api_key="stub")
+        thread = client.beta.threads.create()
+        client.beta.threads.messages.create(thread_id=thread.id, role="user", content=msg)
+        reply = app.run_assistant(client, thread.id)
+        client.close()
+        return reply
+
+    def pooled(visitor, msg):
+        return app._openai_reply(msg, None, datetime.now(), visitor)
+
+    total = args.visitors * args.messages
+    print(f"{args.visitors} visitors x {args.messages} messages, connect={args.connect_latency}s "
+          f"api={args.api_latency}s run={args.run_seconds}s {'poll' if args.poll else 'stream'}")
+    print(f"{'path':<9} {'calls/msg':>9} {'conns/msg':>9} {'mean s':>7} {'p50 s':>7}")
+    for name, fn in (("per-call", per_call), ("pooled", pooled)):
+        calls_before = sum(state.calls.values())
+        conns_before = state.connections
+        latencies = []
+        for m in range(args.messages):
+            for v in range(args.visitors):
+                started = time.perf_counter()
+                assert fn(f"bench:{v}", f"Question {m} from visitor {v}")
+                latencies.append(time.perf_counter() - started)
+        calls = (sum(state.calls.values()) - calls_before) / total
+        conns = (state.connections - conns_before) / total
+        print(f"{name:<9} {calls:>9.2f} {conns:>9.2f} {statistics.mean(latencies):>7.3f} "
+              f"{statistics.median(latencies):>7.3f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Throughput and tail latency of the Assistant run engine vs the old sleep(1) loop.
+
+Each simulated worker thread does what openai_fallback does per message:
+create a thread, add the message, run the assistant and read the reply,
+all against a local stub of the Assistants API.
+
+    python benchmarks/run_engine_bench.py --requests 64 --concurrency 4 32
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openai
+
+import app
+from stub_assistants import start_stub
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+
+def legacy_run(client, thread_id):
+    """The pre-engine loop: fixed 1s sleeps, then list messages."""
+    run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=app.ASSISTANT_ID)
+    while run.status not in ["completed", "failed"]:
+        time.sleep(1)
+        run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+    if run.status == "completed":
+        for msg in client.beta.threads.messages.list(thread_id=thread_id).data:
+            if msg.role == "assistant":
+                return msg.content[0].text.value
+    return None
+
+
+def engine_run(streaming):
+    def run(client, thread_id):
+        app.RUN_STREAMING = streaming
+        return app.run_assistant(client, thread_id)
+    return run
+
+
+MODES = {
+    "legacy-sleep(1)": legacy_run,
+    "engine-poll": engine_run(False),
+    "engine-stream": engine_run(True),
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def bench(mode, client, n_requests, concurrency):
+    run = MODES[mode]
+
+    def one(submitted):
+        thread = client.beta.threads.create()
+        client.beta.threads.messages.create(thread_id=thread.id, role="user", content="What's on today?")
+        ok = bool(run(client, thread.id))
+        return time.perf_counter() - submitted, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(one, time.perf_counter()) for _ in range(n_requests)]
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+    latencies = [r[0] for r in results]
+    return {
+        "throughput": n_requests / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": percentile(latencies, 99),
+        "errors": sum(1 for r in results if not r[1]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 32],
+                        help="threads per worker (1 == a gunicorn sync worker)")
+    parser.add_argument("--run-seconds", type=float, default=0.6)
+    parser.add_argument("--api-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    server, _, base_url = start_stub(run_seconds=args.run_seconds, api_latency=args.api_latency)
+    client = openai.OpenAI(api_key="stub", base_url=base_url, max_retries=0)
+    print(f"run={args.run_seconds}s api_latency={args.api_latency}s requests={args.requests}")
+    print(f"{'mode':<16} {'threads':>7} {'req/s':>8} {'p50 s':>7} {'p99 s':>7} {'errors':>6}")
+    for concurrency in args.concurrency:
+        for mode in MODES:
+            r = bench(mode, client, args.requests, concurrency)
+            print(f"{mode:<16} {concurrency:>7} {r['throughput']:>8.2f} {r['p50']:>7.2f} {r['p99']:>7.2f} {r['errors']:>6}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Cold-start cost: import time and time to the first local and AI replies.
+
+Boots the app the way a scale-to-zero host does after a lull, as a fresh
+`gunicorn -c gunicorn.conf.py app:app`, against the Assistants stub.
+--connect-latency stands in for the first TLS handshake to OpenAI. The
+clock starts at process launch. It reports when /test first answers, then
+the first bathroom question, then the first question that needs the AI.
+--before REV runs the same measurements on an earlier commit (checked out
+to a temporary directory with `git archive`) for comparison.
+
+    python benchmarks/startup_bench.py --boots 5 --before <commit>
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from load_bench import free_port
+from stub_assistants import start_stub
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+
+
+def export_tree(rev, dest):
+    archive = subprocess.run(["git", "archive", "--format=tar", rev], cwd=ROOT, check=True, capture_output=True)
+    subprocess.run(["tar", "-x", "-C", dest], input=archive.stdout, check=True)
+    return dest
+
+
+def import_seconds(tree, env):
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=tree, env=env, check=True,
+                         capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def post(base, body, timeout=40):
+    req = urllib.request.Request(base + "/sms", data=json.dumps({"Body": body}).encode(),
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())["reply"]
+
+
+def boot(tree, env, ai_delay):
+    """Seconds from launch to: serving /test, first local reply, first AI reply."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app",
+                             "--bind", f"127.0.0.1:{port}", "--log-level", "warning"],
+                            cwd=tree, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(base + "/test", timeout=1).read()
+                break
+            except OSError:
+                if proc.poll() is not None or time.perf_counter() - started > 30:
+                    raise RuntimeError(f"gunicorn did not start in {tree}")
+                time.sleep(0.01)
+        up = time.perf_counter() - started
+        post(base, "where is the bathroom?")
+        local = time.perf_counter() - started
+        time.sleep(ai_delay)
+        sent = time.perf_counter()
+        post(base, "what should I see first?")
+        ai = time.perf_counter() - started
+        return up, local, ai, time.perf_counter() - sent
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boots", type=int, default=5, help="cold starts per tree")
+    parser.add_argument("--before", help="git revision to compare against")
+    parser.add_argument("--preload", action="store_true", help="run with GUNICORN_PRELOAD=1")
+    parser.add_argument("--ai-delay", type=float, default=0.0,
+                        help="seconds between the first local reply and the first AI question")
+    parser.add_argument("--connect-latency", type=float, default=0.15)
+    parser.add_argument("--run-seconds", type=float, default=0.3)
+    args = parser.parse_args()
+
+    stub, _, base_url = start_stub(run_seconds=args.run_seconds, api_latency=0.02,
+                                   connect_latency=args.connect_latency)
+    env = dict(os.environ, OPENAI_API_KEY="stub", OPENAI_BASE_URL=base_url, LOG_SAMPLE_RATE="0",
+               REPLY_CACHE_MAX_ENTRIES="0", WEB_CONCURRENCY="1",
+               GUNICORN_PRELOAD="1" if args.preload else "0")
+    trees = [("current", ROOT)]
+    tmp = None
+    if args.before:
+        tmp = tempfile.TemporaryDirectory()
+        trees.insert(0, (args.before, export_tree(args.before, tmp.name)))
+
+    print(f"{'tree':<12} {'import s':>9} {'up s':>6} {'1st local s':>12} {'1st AI s':>9} {'AI reply s':>11}")
+    for name, tree in trees:
+        imports = [import_seconds(tree, env) for _ in range(args.boots)]
+        boots = [boot(tree, env, args.ai_delay) for _ in range(args.boots)]
+        med = [statistics.median(col) for col in zip(*boots)]
+        print(f"{name[:12]:<12} {statistics.median(imports):>9.3f} {med[0]:>6.2f} {med[1]:>12.2f} "
+              f"{med[2]:>9.2f} {med[3]:>11.2f}")
+    stub.shutdown()
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""A local stand-in for the parts of the OpenAI Assistants API the app uses.
+
+Threads, messages and runs are kept in memory. Runs take --run-seconds to
+finish (streamed as message deltas when `stream: true`), every call costs
+--api-latency of extra server time, every new connection costs
+--connect-latency, and --failure-rate of runs fail.
+
+    python benchmarks/stub_assistants.py --port 8099 --run-seconds 1.5
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=stub python app.py
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = ("Tonight the Live Coding Demo starts at 4:00 PM in Gallery 3【4:0†events.json】. "
+         "Admission is free on your first visit, so grab a ticket at the door!")
+
+
+class StubState:
+    def __init__(self, run_seconds=1.5, api_latency=0.02, failure_rate=0.0, chunks=12, reply=REPLY,
+                 connect_latency=0.0):
+        self.run_seconds = run_seconds
+        self.api_latency = api_latency
+        self.connect_latency = connect_latency
+        self.failure_rate = failure_rate
+        self.chunks = chunks
+        self.reply = reply
+        self.ids = itertools.count(1)
+        self.lock = threading.RLock()
+        self.runs = {}
+        self.messages = {}
+        self.calls = {}
+        self.connections = 0
+
+    def new_id(self, prefix):
+        with self.lock:
+            return f"{prefix}_{next(self.ids)}"
+
+    def count(self, name):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+
+def _message(msg_id, thread_id, role, text, run_id=None):
+    return {
+        "id": msg_id, "object": "thread.message", "created_at": int(time.time()),
+        "thread_id": thread_id, "role": role, "run_id": run_id, "assistant_id": None,
+        "status": "completed", "attachments": [], "metadata": {},
+        "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+    }
+
+
+def _run(run, status):
+    return {
+        "id": run["id"], "object": "thread.run", "created_at": int(run["started"]),
+        "thread_id": run["thread_id"], "assistant_id": run["assistant_id"], "status": status,
+        "instructions": "", "model": "stub", "tools": [], "metadata": {},
+        "parallel_tool_calls": True,
+    }
+
+
+def _split(text, n):
+    size = max(1, -(-len(text) // n))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # Stands in for the TCP + TLS handshake a fresh connection to the real API pays
+            time.sleep(state.connect_latency)
+            with state.lock:
+                state.connections += 1
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, body, status=200):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_POST(self):
+            time.sleep(state.api_latency)
+            body = self._body()
+            path = self.path.split("?")[0]
+            if path == "/v1/threads":
+                state.count("threads.create")
+                thread_id = state.new_id("thread")
+                initial = [_message(state.new_id("msg"), thread_id, m.get("role", "user"), m.get("content", ""))
+                           for m in body.get("messages") or []]
+                with state.lock:
+                    state.messages[thread_id] = initial
+                return self._json({"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}})
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/messages", path):
+                state.count("messages.create")
+                msg = _message(state.new_id("msg"), m[1], "user", body.get("content", ""))
+                with state.lock:
+                    state.messages.setdefault(m[1], []).append(msg)
+                return self._json(msg)
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/runs", path):
+                state.count("runs.create")
+                run = {
+                    "id": state.new_id("run"), "thread_id": m[1], "assistant_id": body.get("assistant_id"),
+                    "started": time.time(), "fails": random.random() < state.failure_rate, "cancelled": False,
+                }
+                with state.lock:
+                    state.runs[run["id"]] = run
+                if body.get("stream"):
+                    return self._stream(run)
+                return self._json(_run(run, "queued"))
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/runs/([^/]+)/cancel", path):
+                state.count("runs.cancel")
+                with state.lock:
+                    run = state.runs[m[2]]
+                    run["cancelled"] = True
+                return self._json(_run(run, "cancelling"))
+            self._json({"error": {"message": f"no stub for POST {path}"}}, 404)
+
+        def do_GET(self):
+            time.sleep(state.api_latency)
+            path = self.path.split("?")[0]
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/runs/([^/]+)", path):
+                state.count("runs.retrieve")
+                with state.lock:
+                    run = state.runs[m[2]]
+                return self._json(_run(run, self._status(run)))
+            if m := re.fullmatch(r"/v1/assistants/([^/]+)", path):
+                state.count("assistants.retrieve")
+                return self._json({"id": m[1], "object": "assistant", "created_at": int(time.time()),
+                                   "name": "Canyon Concierge (stub)", "description": None, "model": "gpt-4o",
+                                   "instructions": None, "tools": [], "metadata": {}})
+            if m := re.fullmatch(r"/v1/threads/([^/]+)/messages", path):
+                state.count("messages.list")
+                with state.lock:
+                    data = list(reversed(state.messages.get(m[1], [])))
+                return self._json({"object": "list", "data": data, "first_id": None, "last_id": None, "has_more": False})
+            self._json({"error": {"message": f"no stub for GET {path}"}}, 404)
+
+        def _status(self, run):
+            if run["cancelled"]:
+                return "cancelled"
+            if time.time() - run["started"] < state.run_seconds:
+                return "in_progress"
+            if run["fails"]:
+                return "failed"
+            self._finish(run)
+            return "completed"
+
+        def _finish(self, run):
+            with state.lock:
+                if not run.get("message_id"):
+                    run["message_id"] = state.new_id("msg")
+                    msg = _message(run["message_id"], run["thread_id"], "assistant", state.reply, run["id"])
+                    state.messages.setdefault(run["thread_id"], []).append(msg)
+
+        def _event(self, name, data):
+            payload = data if isinstance(data, str) else json.dumps(data)
+            chunk = f"event: {name}\ndata: {payload}\n\n".encode()
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+
+        def _stream(self, run):
+            # Chunked like the real API, so the connection stays reusable afterwards
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                self._event("thread.run.created", _run(run, "queued"))
+                # Half the run is "thinking", the other half streams tokens
+                time.sleep(state.run_seconds / 2)
+                if run["fails"]:
+                    self._event("thread.run.failed", _run(run, "failed"))
+                else:
+                    msg_id = state.new_id("msg")
+                    pieces = _split(state.reply, state.chunks)
+                    for piece in pieces:
+                        if run["cancelled"]:
+                            self._event("thread.run.cancelled", _run(run, "cancelled"))
+                            break
+                        self._event("thread.message.delta", {
+                            "id": msg_id, "object": "thread.message.delta",
+                            "delta": {"content": [{"index": 0, "type": "text", "text": {"value": piece}}]},
+                        })
+                        time.sleep(state.run_seconds / 2 / len(pieces))
+                    else:
+                        self._finish(run)
+                        self._event("thread.run.completed", _run(run, "completed"))
+                self._event("done", "[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing idle keep-alive connections is expected, not an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_stub(port=0, **config):
+    """Serve the stub on a background thread; returns (server, state, base_url)."""
+    state = StubState(**config)
+    server = StubServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--run-seconds", type=float, default=1.5)
+    parser.add_argument("--api-latency", type=float, default=0.02)
+    parser.add_argument("--connect-latency", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server, _, base_url = start_stub(
+        args.port, run_seconds=args.run_seconds, api_latency=args.api_latency,
+        connect_latency=args.connect_latency, failure_rate=args.failure_rate,
+    )
+    print(f"Stub Assistants API on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
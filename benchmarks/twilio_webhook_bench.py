@@ -0,0 +1,78 @@
+"""Twilio webhook latency, inline TwiML vs TWILIO_ASYNC_REPLIES, as the AI slows down.
+
+Posts Twilio-style form webhooks to /sms through Flask's test client while
+the Assistant is a local stub and outbound SMS go to a fake sink. Reports
+webhook latency and, for async mode, when the reply actually reached the
+sink.
+
+    python benchmarks/twilio_webhook_bench.py --run-seconds 0.5 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sms_sink import start_sink
+from stub_assistants import start_stub
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--run-seconds", type=float, nargs="+", default=[0.5, 3.0])
+    args = parser.parse_args()
+
+    stub, stub_state, openai_base = start_stub()
+    sink, sink_state, twilio_base = start_sink(latency=0.02)
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.update(OPENAI_API_KEY="stub", OPENAI_BASE_URL=openai_base, REPLY_CACHE_MAX_ENTRIES="0",
+                      BROADCAST_DB=os.path.join(tmp.name, "bench.db"),
+                      TWILIO_API_BASE=twilio_base, TWILIO_ACCOUNT_SID="AC0", TWILIO_AUTH_TOKEN="x",
+                      SMS_WORKERS=str(args.requests), AI_MAX_CONCURRENT_RUNS=str(args.requests),
+                      # Each From number sends once per mode per run length; don't rate-limit it into degraded replies
+                      AI_SENDER_RATE_PER_MINUTE="0")
+    import app
+    app.app.logger.disabled = True
+    client = app.app.test_client()
+
+    print(f"{'mode':<6} {'run s':>6} {'webhook p50 ms':>15} {'webhook p99 ms':>15} {'delivered p50 s':>16}")
+    for run_seconds in args.run_seconds:
+        stub_state.run_seconds = run_seconds
+        for mode in ("inline", "async"):
+            app.TWILIO_ASYNC_REPLIES = mode == "async"
+            sent_before = len(sink_state.messages)
+
+            def post(i):
+                started = time.perf_counter()
+                client.post("/sms", data={"Body": f"Tell me something odd #{i}", "From": f"+1555000{i:04d}",
+                                          "To": "+15559999999", "MessageSid": f"SM{mode}{run_seconds}{i}"})
+                return started, time.perf_counter() - started
+
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                results = list(pool.map(post, range(args.requests)))
+            webhook = sorted(r[1] * 1000 for r in results)
+            delivered = "-"
+            if mode == "async":
+                while len(sink_state.messages) - sent_before < args.requests:
+                    time.sleep(0.05)
+                starts = {f"+1555000{i:04d}": r[0] for i, r in enumerate(results)}
+                waits = [m["at"] - starts[m["to"]] for m in sink_state.messages[sent_before:]]
+                delivered = f"{statistics.median(waits):.2f}"
+            print(f"{mode:<6} {run_seconds:>6} {statistics.median(webhook):>15.1f} "
+                  f"{webhook[int(0.99 * (len(webhook) - 1))]:>15.1f} {delivered:>16}")
+    stub.shutdown()
+    sink.shutdown()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
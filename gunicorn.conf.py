@@ -0,0 +1,36 @@
+# Gunicorn picks this file up automatically from the working directory.
+import os
+import sys
+
+# Replies spend nearly all their time waiting on the Assistants API, so
+# threaded workers let one process hold many in-flight runs instead of
+# one run per sync worker.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+# Slightly above RUN_DEADLINE_SECONDS so the run deadline fires first
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '35'))
+keepalive = 5
+# Import the app (and the OpenAI SDK) once in the master and fork workers
+# from it, instead of every worker importing on its own
+preload_app = os.getenv('GUNICORN_PRELOAD', '0') == '1'
+
+
+def pre_fork(server, worker):
+    # Only set when preloading: the master has imported the app
+    app = sys.modules.get('app')
+    if app is not None:
+        app.before_fork()
+
+
+def post_fork(server, worker):
+    app = sys.modules.get('app')
+    if app is not None:
+        app.after_fork()
+
+
+def post_worker_init(worker):
+    # Open the OpenAI connection before the worker's first visitor asks for it
+    app = sys.modules.get('app')
+    if app is not None:
+        app.warm_up()
@@ -8,6 +8,31 @@ function addMessage(text, sender) {
   msg.innerHTML = text.replace(/\n/g, '<br>');
   chat.appendChild(msg);
   chat.scrollTop = chat.scrollHeight;
+  return msg;
+}
+
+// Read /webchat/stream's Server-Sent Events, calling onText for each piece of the reply
+async function streamReply(res, onText) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const {done, value} = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, {stream: true});
+    let end;
+    while ((end = buffer.indexOf('\n\n')) !== -1) {
+      const event = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      if (event.startsWith('event: done')) return;
+      if (event.startsWith('event: truncated')) {
+        onText('\n\n(Sorry, that reply got cut off. Ask again?)');
+        continue;
+      }
+      const data = event.split('\n').find(line => line.startsWith('data: '));
+      if (data) onText(JSON.parse(data.slice(6)).text);
+    }
+  }
 }
 
 form.addEventListener('submit', async (e) => {
@@ -16,16 +41,28 @@ form.addEventListener('submit', async (e) => {
   if (!userText) return;
   addMessage(userText, 'user');
   input.value = '';
+  const body = JSON.stringify({Body: userText, User: 'Web Guest', Visited: false});
+  const headers = {'Content-Type': 'application/json'};
+  let msg = null;
+  let reply = '';
   try {
-    const res = await fetch('/webchat', {
-      method: 'POST',
-      headers: {'Content-Type': 'application/json'},
-      body: JSON.stringify({Body: userText, User: 'Web Guest', Visited: false})
-    });
-    const data = await res.json();
-    addMessage(data.reply, 'bot');
+    if (window.ReadableStream && window.TextDecoder) {
+      const res = await fetch('/webchat/stream', {method: 'POST', headers, body});
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+      await streamReply(res, (text) => {
+        reply += text;
+        if (!msg) msg = addMessage('', 'bot');
+        msg.innerHTML = reply.replace(/\n/g, '<br>');
+        chat.scrollTop = chat.scrollHeight;
+      });
+    } else {
+      const res = await fetch('/webchat', {method: 'POST', headers, body});
+      const data = await res.json();
+      msg = addMessage(data.reply, 'bot');
+    }
+    if (!msg) throw new Error('empty reply');
   } catch (err) {
-    addMessage('Oops, something glitched. Try again?', 'bot');
+    if (!msg) addMessage('Oops, something glitched. Try again?', 'bot');
   }
 });
 
@@ -0,0 +1,55 @@
+"""Broadcasts validate their input and honour a STOP that arrives mid-send."""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("template", [5, ["x"], {"a": 1}])
+def test_non_string_template_is_rejected(monkeypatch, template):
+    monkeypatch.setattr(app, 'ADMIN_TOKEN', 'secret')
+    client = app.app.test_client()
+    resp = client.post('/admin/broadcasts', json={"template": template},
+                       headers={"Authorization": "Bearer secret"})
+    assert resp.status_code == 400
+    assert 'template' in resp.get_json()['error']
+
+
+class RecordingMessenger:
+    """Records sends; the first send opts out `stop_number`, as if they texted STOP meanwhile."""
+
+    def __init__(self, store, stop_number):
+        self.store = store
+        self.stop_number = stop_number
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send(self, to, from_number, body):
+        with self.lock:
+            if not self.sent:
+                self.store.opt_out(self.stop_number)
+            self.sent.append(to)
+
+
+def test_opt_out_mid_broadcast_is_skipped(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, 'EVENT_REMINDERS', False)
+    monkeypatch.setattr(app, 'BROADCAST_BATCH_SIZE', 2)
+    store = app.BroadcastStore(str(tmp_path / 'canyon.db'))
+    numbers = [f"+1555000{i:04d}" for i in range(20)]
+    store.opt_out(numbers[3])
+    messenger = RecordingMessenger(store, numbers[-1])
+    broadcaster = app.Broadcaster(store, messenger, workers=1, rate=0)
+    # Scheduled for later so the scheduler thread leaves it alone; run() sends it now
+    broadcast_id = store.create("Closing soon", "+15559999999", time.time() + 3600, numbers)
+    broadcaster.run({"id": broadcast_id, "body": "Closing soon", "from_number": "+15559999999",
+                     "recipients": numbers})
+    assert sorted(messenger.sent) == sorted(set(numbers) - {numbers[3], numbers[-1]})
+    result = store.get(broadcast_id)
+    assert (result['status'], result['sent'], result['skipped']) == ('done', 18, 2)
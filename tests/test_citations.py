@@ -0,0 +1,63 @@
+"""CitationSanitizer must clean a reply the same way however it is chunked."""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+
+from app import CitationSanitizer
+
+REPLIES = [
+    "Tonight the Live Coding Demo is at 4:00 PM in Gallery 3【4:0†events.json】. Enjoy!",
+    "Try the Pixel Croissant 4:0†menu.json and the Matcha Cloud Latte menu.json.",
+    "Canyon opens at 1pm【12:3†hours.json】【1:1†faq.json】 and closes at 10pm.",
+    "See Neon Aftermath† in Gallery 1.【7:2†exhibits.json】",
+    "A stray bracket at the end【",
+    "An unclosed citation at the end【4:0†events",
+    "The Live Coding Demo is at 4:00 PM【 in Gallery 3. Bring a laptop and buy tickets at the door!",
+    "A long stray bracket【" + "x" * 80 + " and the rest of the reply",
+    "Spacing   is\n\ncollapsed ( kept ) [too].",
+]
+
+
+def sanitize(chunks):
+    sanitizer = CitationSanitizer()
+    out = ''.join(sanitizer.feed(chunk) for chunk in chunks) + sanitizer.finish()
+    assert out == sanitizer.text
+    return out
+
+
+def random_splits(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, min(8, len(text) - 1))))
+    return [text[i:j] for i, j in zip([0, *cuts], [*cuts, len(text)])]
+
+
+def test_artifacts_removed():
+    assert sanitize([REPLIES[0]]) == "Tonight the Live Coding Demo is at 4:00 PM in Gallery 3. Enjoy!"
+    assert sanitize([REPLIES[1]]) == "Try the Pixel Croissant and the Matcha Cloud Latte"
+    # A stray 【 mid-reply is dropped and the text after it is kept
+    assert sanitize([REPLIES[6]]) == (
+        "The Live Coding Demo is at 4:00 PM in Gallery 3. Bring a laptop and buy tickets at the door!")
+    assert sanitize([REPLIES[7]]).endswith("and the rest of the reply")
+    # Trailing periods and brackets are dropped from the finished reply
+    assert sanitize([REPLIES[3]]) == "See Neon Aftermath in Gallery 1"
+    for reply in REPLIES:
+        cleaned = sanitize([reply])
+        assert '【' not in cleaned and '】' not in cleaned and '†' not in cleaned and '.json' not in cleaned
+
+
+def test_every_split_point_matches_whole():
+    for reply in REPLIES:
+        whole = sanitize([reply])
+        for i in range(1, len(reply)):
+            assert sanitize([reply[:i], reply[i:]]) == whole, (reply, i)
+
+
+def test_random_chunkings_match_whole():
+    rng = random.Random(8)
+    for reply in REPLIES:
+        whole = sanitize([reply])
+        assert sanitize(list(reply)) == whole
+        for _ in range(200):
+            assert sanitize(random_splits(reply, rng)) == whole
@@ -0,0 +1,121 @@
+"""Concurrent misses for one question share a single Assistant run."""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+
+import pytest
+
+import app
+
+
+class Leader:
+    """A compute() that blocks until released, then returns `reply` or raises `error`."""
+
+    def __init__(self, reply="Open until 10pm", error=None):
+        self.reply = reply
+        self.error = error
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.reply
+
+
+def ask(cache, compute, results, deadline=None):
+    try:
+        results.append(cache.get_or_compute("q", 60, compute, deadline))
+    except app.LoadShed as e:
+        results.append(e)
+
+
+def start(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for_waiters(cache, count):
+    deadline = time.monotonic() + 5
+    while cache.snapshot()["coalesced"] < count:
+        assert time.monotonic() < deadline, "waiters never joined the flight"
+        time.sleep(0.005)
+
+
+def test_waiters_share_the_leaders_reply():
+    cache = app.ReplyCache(100, 1024 * 1024)
+    leader = Leader()
+    results = []
+    threads = [start(ask, cache, leader, results)]
+    while not leader.calls:
+        time.sleep(0.005)
+    threads += [start(ask, cache, leader, results) for _ in range(4)]
+    wait_for_waiters(cache, 4)
+    leader.release.set()
+    for t in threads:
+        t.join(5)
+    assert results == ["Open until 10pm"] * 5
+    assert leader.calls == 1
+    # Now cached
+    assert cache.get_or_compute("q", 60, Leader("unused")) == "Open until 10pm"
+    assert cache.snapshot()["hits"] == 1
+
+
+def test_waiter_sheds_at_its_own_deadline():
+    cache = app.ReplyCache(100, 1024 * 1024)
+    leader = Leader()
+    leader_results, waiter_results = [], []
+    leader_thread = start(ask, cache, leader, leader_results)
+    while not leader.calls:
+        time.sleep(0.005)
+    ask(cache, leader, waiter_results, deadline=time.monotonic() + 0.05)
+    assert isinstance(waiter_results[0], app.LoadShed) and waiter_results[0].reason == "budget"
+    # The leader's run carries on and is still cached
+    leader.release.set()
+    leader_thread.join(5)
+    assert leader_results == ["Open until 10pm"]
+    assert cache.get_or_compute("q", 60, Leader("unused")) == "Open until 10pm"
+
+
+@pytest.mark.parametrize("reason", sorted(app.SHARED_SHED_REASONS))
+def test_capacity_shed_is_shared(reason):
+    cache = app.ReplyCache(100, 1024 * 1024)
+    leader = Leader(error=app.LoadShed(reason))
+    results = []
+    threads = [start(ask, cache, leader, results)]
+    while not leader.calls:
+        time.sleep(0.005)
+    threads.append(start(ask, cache, leader, results))
+    wait_for_waiters(cache, 1)
+    leader.release.set()
+    for t in threads:
+        t.join(5)
+    assert [r.reason for r in results] == [reason, reason]
+    assert leader.calls == 1
+
+
+def test_rate_limited_leader_hands_off_to_a_waiter():
+    cache = app.ReplyCache(100, 1024 * 1024)
+    leader = Leader(error=app.LoadShed("rate_limited"))
+    waiter_compute = Leader("Open until 10pm")
+    waiter_compute.release.set()
+    leader_results, waiter_results = [], []
+    leader_thread = start(ask, cache, leader, leader_results)
+    while not leader.calls:
+        time.sleep(0.005)
+    waiter_thread = start(ask, cache, waiter_compute, waiter_results)
+    wait_for_waiters(cache, 1)
+    leader.release.set()
+    leader_thread.join(5)
+    waiter_thread.join(5)
+    assert leader_results[0].reason == "rate_limited"
+    # The waiter's sender isn't over its rate, so it runs the question itself
+    assert waiter_results == ["Open until 10pm"]
+    assert waiter_compute.calls == 1
@@ -0,0 +1,112 @@
+"""Intent router: priority between intents, word boundaries, plurals and hot reload."""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+
+import app
+
+KNOWLEDGE = [
+    {"keywords": ["late", "hours", "open"], "response": "We're open 1-10pm."},
+    {"keywords": ["ticket", "admission"], "response": "Entry is free."},
+    {"keywords": ["location"], "response": "456 Postmodern Ave."},
+]
+
+
+@pytest.fixture
+def router():
+    return app.IntentRouter(app.build_intents(KNOWLEDGE))
+
+
+def intent_of(router, message):
+    intent = router.match(app.normalize_message(message))
+    if intent is None:
+        return None
+    reply = intent['reply']
+    return intent['name'], reply if isinstance(reply, str) else None
+
+
+@pytest.mark.parametrize("message, name", [
+    ("where's the bathroom near neon aftermath?", "bathroom"),
+    ("how do i get to the live coding demo", "directions"),
+    ("what's your location?", "directions"),
+    ("what's the location of the live coding demo", "event"),
+    ("am i too late for the artist q&a?", "event"),
+    ("when is ada loop on", "event"),
+    ("how late are you open", "knowledge:0"),
+    ("hi, when are you open?", "knowledge:0"),
+    ("is the matcha cloud latte any good", "menu_item"),
+    ("any events today?", "events"),
+    ("hello", "greeting"),
+])
+def test_priority(router, message, name):
+    assert intent_of(router, message)[0] == name
+
+
+def test_named_item_gets_its_own_reply(router):
+    assert intent_of(router, "location of the live coding demo?")[1] == "Live Coding Demo is at 4:00 PM in Gallery 3."
+
+
+@pytest.mark.parametrize("message", ["this is great", "what's his name?", "they're heyday", "i want to talk to a human"])
+def test_word_boundaries(router, message):
+    assert intent_of(router, message) is None
+
+
+@pytest.mark.parametrize("message, name", [
+    ("are the toilets free", "bathroom"),
+    ("two tickets please", "knowledge:1"),
+    ("which exhibits are new", "exhibitions"),
+    ("what are the addresses", "directions"),
+])
+def test_plurals(router, message, name):
+    assert intent_of(router, message)[0] == name
+
+
+def test_greetings_have_no_plurals(router):
+    assert intent_of(router, "his") is None
+    assert intent_of(router, "heys") is None
+
+
+@pytest.fixture
+def knowledge_file(tmp_path, monkeypatch):
+    path = tmp_path / "custom_knowledge.json"
+    monkeypatch.setattr(app, 'KNOWLEDGE_PATH', str(path))
+    monkeypatch.setattr(app, '_router', None)
+    monkeypatch.setattr(app, '_router_mtime', None)
+
+    def write(content):
+        path.write_text(content if isinstance(content, str) else json.dumps(content), encoding='utf-8')
+        # Force the next lookup to notice the change
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        app._router_checked = 0.0
+        return app.get_intent_router()
+    return write
+
+
+def test_hot_reload(knowledge_file):
+    router = knowledge_file([{"keywords": ["parking"], "response": "No parking, sorry."}])
+    assert intent_of(router, "is there parking?") == ("knowledge:0", "No parking, sorry.")
+    router = knowledge_file([{"keywords": ["parking"], "response": "Parking on level 2."}])
+    assert intent_of(router, "is there parking?") == ("knowledge:0", "Parking on level 2.")
+
+
+def test_unparsable_file_keeps_previous_router(knowledge_file):
+    before = knowledge_file([{"keywords": ["parking"], "response": "No parking, sorry."}])
+    assert knowledge_file('[{"keywords": ["parking"], "resp') is before
+    assert knowledge_file({"keywords": ["parking"]}) is before
+
+
+def test_malformed_entries_are_skipped(knowledge_file):
+    router = knowledge_file([
+        {"keywords": ["hours", 10], "response": "bad keyword"},
+        {"keywords": "parking", "response": "keywords not a list"},
+        {"keywords": ["coat check"], "response": None},
+        {"keywords": ["lockers"], "response": "Lockers are by the entrance."},
+    ])
+    assert intent_of(router, "do you have lockers") == ("knowledge:0", "Lockers are by the entrance.")
+    assert intent_of(router, "bathroom")[0] == "bathroom"
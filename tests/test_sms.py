@@ -0,0 +1,31 @@
+"""Twilio webhooks must always get well-formed TwiML back."""
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+
+import app
+
+
+def twilio_post(body):
+    client = app.app.test_client()
+    resp = client.post('/sms', data={"Body": body, "From": "+15550001111", "To": "+15559999999"})
+    assert resp.mimetype == 'application/xml'
+    return ET.fromstring(resp.data).find('Message').text
+
+
+def test_reply_with_ampersand_is_escaped(monkeypatch):
+    monkeypatch.setattr(app, 'record_sms_sender', lambda number, branch: None)
+    assert twilio_post("when is the artist q&a?") == "Artist Q&A: Ada Loop is at 2:00 PM in Auditorium."
+
+
+def test_degraded_reply_is_escaped(monkeypatch):
+    def shed(*args, **kwargs):
+        raise app.LoadShed("queue_full")
+    monkeypatch.setattr(app, 'record_sms_sender', lambda number, branch: None)
+    monkeypatch.setattr(app, 'openai_fallback', shed)
+    monkeypatch.setattr(app, 'EVENTS', [{"name": "Q&A <live>", "time": "11:59 PM", "location": "Hall"}])
+    message = twilio_post("zzzz qqqq")
+    assert "Next up: Q&A <live> at 11:59 PM in Hall." in message
@@ -0,0 +1,71 @@
+"""The SQLite reply queue keeps per-number order and drops Twilio retries across workers."""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+
+import pytest
+
+import app
+
+
+class RecordingMessenger:
+    def __init__(self):
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send(self, to, from_number, body):
+        with self.lock:
+            self.sent.append((to, body))
+
+    def wait_for(self, count, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.lock:
+                if len(self.sent) >= count:
+                    return list(self.sent)
+            time.sleep(0.01)
+        pytest.fail(f"only {len(self.sent)} of {count} replies sent")
+
+
+def slow_answer(body, visitor=None, deadline=None):
+    # Earlier messages take longer, so without per-number ordering they'd arrive last
+    time.sleep(0.05 * (4 - int(body.split(':')[1])))
+    return 'ai', body
+
+
+@pytest.fixture
+def workers(monkeypatch, tmp_path):
+    """Two dispatchers on one database file, like two gunicorn workers."""
+    monkeypatch.setattr(app, 'SMS_POLL_SECONDS', 0.05)
+    path = str(tmp_path / 'canyon.db')
+    messenger = RecordingMessenger()
+    dispatchers = [app.SmsReplyDispatcher(messenger, app.BroadcastStore(path), workers=3, answer=slow_answer)
+                   for _ in range(2)]
+    return messenger, dispatchers
+
+
+def test_replies_keep_per_number_order(workers):
+    messenger, dispatchers = workers
+    numbers = ["+15550000001", "+15550000002", "+15550000003"]
+    for i in range(5):
+        for n, number in enumerate(numbers):
+            # Alternate workers so consecutive messages from one number land in different processes
+            dispatchers[(i + n) % 2].submit(f"SM{n}{i}", number, "+15559999999", f"{number}:{i}")
+    sent = messenger.wait_for(15)
+    for number in numbers:
+        assert [body for to, body in sent if to == number] == [f"{number}:{i}" for i in range(5)]
+
+
+def test_duplicate_message_sid_is_sent_once(workers):
+    messenger, dispatchers = workers
+    assert dispatchers[0].submit("SMretry", "+15550000001", "+15559999999", "hello", reply="hi") is True
+    # Twilio's webhook retry reaches the other worker
+    assert dispatchers[1].submit("SMretry", "+15550000001", "+15559999999", "hello", reply="hi") is False
+    assert messenger.wait_for(1) == [("+15550000001", "hi")]
+    time.sleep(0.2)
+    assert len(messenger.sent) == 1
+    assert dispatchers[1].snapshot()["duplicates"] == 1